@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def token_id(avatar: str) -> int:
+    """Hub ERC-1155 id of an avatar's personal Circles: its address as an integer."""
+    return int(avatar, 16)
+
+
+class BalanceTracker:
+    """Hub balances of subscribers, fetched at most once per block, and who recently couldn't pay.
+
+    A subscriber is marked when the pathfinder confirmed it cannot pay a subscription, and stays
+    marked until a Hub transfer into it is seen or `mark_ttl` seconds pass. Only marked
+    subscribers are pre-checked: `totals` sums their balances of every token they are known to
+    hold (their own personal token, plus the tokens their past paths spent) with one `fetch`
+    call for all of them, cached until the block changes. The known tokens are a subset of what
+    a subscriber may hold, which is why an unmarked subscriber is never judged by them.
+    """
+
+    def __init__(
+        self, fetch: Callable[[List[str], List[int]], List[int]], mark_ttl: float = 3600.0
+    ):
+        self.fetch = fetch
+        self.mark_ttl = mark_ttl
+
+        self._tokens: Dict[str, Set[int]] = {}
+        self._marked: Dict[str, float] = {}
+        self._block_number: Optional[int] = None
+        self._balances: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def learn(self, account: str, token_owners: Iterable[str]) -> None:
+        """Remember tokens `account` spent in a path, so later pre-checks include them."""
+        with self._lock:
+            self._tokens.setdefault(account.lower(), set()).update(
+                token_id(owner) for owner in token_owners
+            )
+
+    def mark_underfunded(self, account: str) -> None:
+        with self._lock:
+            self._marked[account.lower()] = time.monotonic() + self.mark_ttl
+
+    def is_marked(self, account: str) -> bool:
+        with self._lock:
+            expires_at = self._marked.get(account.lower())
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._marked[account.lower()]
+                return False
+            return True
+
+    def invalidate(self, *accounts: str) -> None:
+        """Circles arrived at `accounts`: clear their marks and any balances cached for them."""
+        with self._lock:
+            for account in accounts:
+                account = account.lower()
+                self._marked.pop(account, None)
+                for token in self._tokens.get(account, ()):
+                    self._balances.pop((account, token), None)
+                self._balances.pop((account, token_id(account)), None)
+
+    def totals(self, block_number: int, accounts: Iterable[str]) -> Dict[str, int]:
+        """Known balance of each of `accounts` at `block_number`, keyed by lower-cased address."""
+        accounts = {account.lower() for account in accounts}
+        with self._lock:
+            if block_number != self._block_number:
+                self._block_number = block_number
+                self._balances.clear()
+
+            pairs = [
+                (account, token)
+                for account in accounts
+                for token in self._tokens.get(account, set()) | {token_id(account)}
+            ]
+            missing = [pair for pair in pairs if pair not in self._balances]
+
+        if missing:
+            balances = list(
+                self.fetch([account for account, _ in missing], [token for _, token in missing])
+            )
+            if len(balances) != len(missing):
+                raise ValueError(f"expected {len(missing)} balances, got {len(balances)}")
+            with self._lock:
+                if block_number == self._block_number:
+                    self._balances.update(zip(missing, balances))
+        else:
+            balances = []
+
+        fetched = dict(zip(missing, balances))
+        with self._lock:
+            totals = dict.fromkeys(accounts, 0)
+            for pair in pairs:
+                balance = fetched.get(pair, self._balances.get(pair, 0))
+                totals[pair[0]] += int(balance)
+            return totals
@@ -0,0 +1,418 @@
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List
+
+import click
+import psycopg2
+import psycopg2.extensions
+from aiohttp import web
+
+from table import SCHEMA_STATEMENTS
+
+BENCH_SCHEMA = "subi_bench"
+BLOCK_TIME = 5
+
+# Mock chain: ape's local test network, with a throwaway keystore so the bot's import succeeds
+os.environ.setdefault("SILVERBACK_NETWORK_CHOICE", "ethereum:local:test")
+os.environ.setdefault("APE_DATA_FOLDER", tempfile.mkdtemp(prefix="subi-bench-"))
+os.environ.setdefault("ALIAS", "bench")
+os.environ.setdefault("PASSPHRASE", "bench-passphrase")
+os.environ.setdefault("PRIVATE_KEY", "0x" + "42" * 32)
+os.environ.setdefault("START_BLOCK", "0")
+# Every connection the bot opens works inside the benchmark schema, never on real tables
+os.environ["PGOPTIONS"] = f"-c search_path={BENCH_SCHEMA}"
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Connection whose cursors, of any cursor_factory, count statements sent to the server."""
+
+    statements = 0
+    _lock = threading.Lock()
+    _cursor_classes: Dict[type, type] = {}
+
+    def cursor(self, *args, cursor_factory=None, **kwargs):
+        base = cursor_factory or self.cursor_factory or psycopg2.extensions.cursor
+        counting = CountingConnection._cursor_classes.get(base)
+        if counting is None:
+            counting = type(f"Counting{base.__name__}", (_CountingCursor, base), {})
+            CountingConnection._cursor_classes[base] = counting
+        return super().cursor(*args, cursor_factory=counting, **kwargs)
+
+
+class _CountingCursor:
+    def execute(self, query, vars=None):
+        with CountingConnection._lock:
+            CountingConnection.statements += 1
+        return super().execute(query, vars)
+
+
+# Synthetic data
+def random_address(rnd: random.Random) -> str:
+    return "0x" + "".join(rnd.choice("0123456789abcdef") for _ in range(40))
+
+
+def generate_subscriptions(count: int, modules: int = 16, seed: int = 0) -> List[Dict]:
+    """Subscription rows as produced by the backfill, spread over `modules` modules."""
+    rnd = random.Random(seed)
+    module_addresses = [random_address(rnd) for _ in range(modules)]
+    return [
+        {
+            "block_number": i,
+            "sub_id": i // modules,
+            "module": module_addresses[i % modules],
+            "subscriber": random_address(rnd),
+            "recipient": random_address(rnd),
+            "amount": rnd.randint(1, 10**6) * 10**12,
+            "frequency": rnd.choice([3600, 86400, 604800]),
+            "redeem_at": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def generate_transfers(
+    source: str, sink: str, amount: int, routes: int = 3, hops: int = 4, seed: int = 0
+) -> List[Dict]:
+    """Pathfinder `transfers` moving `amount` from `source` to `sink` over parallel routes."""
+    rnd = random.Random(seed)
+    shares = [amount // routes] * routes
+    shares[-1] += amount - sum(shares)
+
+    transfers = []
+    for share in shares:
+        path = [source] + [random_address(rnd) for _ in range(hops - 1)] + [sink]
+        for sender, receiver in zip(path, path[1:]):
+            transfers.append(
+                {"from": sender, "to": receiver, "tokenOwner": sender, "value": str(share)}
+            )
+
+    return transfers
+
+
+def generate_redemption_logs(subscriptions: List[Dict], count: int, seed: int = 0) -> List:
+    rnd = random.Random(seed)
+    return [
+        SimpleNamespace(
+            event_name="Redeemed",
+            block_number=i,
+            log_index=0,
+            subId=sub["sub_id"],
+            module=sub["module"],
+            nextRedeemAt=rnd.randint(1, 2**31),
+        )
+        for i, sub in enumerate(rnd.choices(subscriptions, k=count))
+    ]
+
+
+def generate_block(number: int, timestamp: int) -> SimpleNamespace:
+    """Block header on a synthetic chain whose hashes are derived from the block number."""
+    return SimpleNamespace(
+        number=number,
+        timestamp=timestamp,
+        hash=number.to_bytes(32, "big"),
+        parent_hash=max(number - 1, 0).to_bytes(32, "big"),
+    )
+
+
+# Mock pathfinder
+class MockPathfinder:
+    """JSON-RPC server answering circlesV2_findPath (single or batched) with synthetic paths."""
+
+    def __init__(self, routes: int, hops: int, latency: float):
+        self.routes = routes
+        self.hops = hops
+        self.latency = latency
+        self.requests = 0
+        self.queries = 0
+        self.url = None
+
+    def start(self) -> None:
+        started = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            app = web.Application()
+            app.router.add_post("/", self._handle)
+            runner = web.AppRunner(app)
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            loop.run_until_complete(site.start())
+            port = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://127.0.0.1:{port}/"
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, name="mock-pathfinder", daemon=True).start()
+        started.wait()
+
+    async def _handle(self, request):
+        payload = await request.json()
+        calls = payload if isinstance(payload, list) else [payload]
+        self.requests += 1
+        self.queries += len(calls)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        results = []
+        for call in calls:
+            query = call["params"][0]
+            transfers = generate_transfers(
+                query["Source"],
+                query["Sink"],
+                int(query["TargetFlow"]),
+                routes=self.routes,
+                hops=self.hops,
+                seed=hash((query["Source"], query["Sink"])),
+            )
+            results.append({"jsonrpc": "2.0", "id": call["id"], "result": {"transfers": transfers}})
+
+        return web.json_response(results if isinstance(payload, list) else results[0])
+
+
+# Measurement
+class Measurement:
+    def __init__(self):
+        self.elapsed = 0.0
+        self.statements = 0
+        self.peak_memory = 0
+
+
+TRACE_MEMORY = False
+
+
+@contextlib.contextmanager
+def measure():
+    """Time the block and count its DB statements, plus peak Python allocations if tracing.
+
+    tracemalloc slows allocation-heavy code down severalfold, so timings taken with
+    TRACE_MEMORY on are only comparable with each other.
+    """
+    result = Measurement()
+    statements = CountingConnection.statements
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield result
+    finally:
+        result.elapsed = time.perf_counter() - started
+        if TRACE_MEMORY:
+            result.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result.statements = CountingConnection.statements - statements
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)] if values else 0.0
+
+
+# Scenarios
+def reset_bot_state(bot) -> None:
+    from executor import RedemptionExecutor
+    from indexer import EventIndexer
+    from payloads import PayloadStore
+    from scheduler import RedemptionScheduler
+
+    bot.redemption_executor.shutdown(wait=True)
+    bot.redemption_executor = RedemptionExecutor(
+        max_workers=bot.REDEMPTION_CONCURRENCY, max_pending=bot.REDEMPTION_BATCH_LIMIT
+    )
+    bot.scheduler = RedemptionScheduler()
+    bot.indexer = EventIndexer(
+        bot.db_pool,
+        block_hash=lambda number: number.to_bytes(32, "big"),
+        confirmations=bot.CONFIRMATION_DEPTH,
+    )
+    bot.payload_store = PayloadStore()
+    bot.path_cache.clear()
+
+
+def execute(*statements: str) -> None:
+    """Run `statements` in one transaction on a short-lived connection."""
+    with contextlib.closing(psycopg2.connect(os.environ["DATABASE_URL"])) as conn:
+        with conn, conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+
+
+def bench_size(bot, pathfinder: MockPathfinder, size: int, blocks: int, samples: int) -> Dict:
+    execute("TRUNCATE subscriptions")
+    reset_bot_state(bot)
+    report = {"size": size}
+    subscriptions = generate_subscriptions(size)
+
+    with measure() as m:
+        bot._save_subscriptions_db(subscriptions)
+    report["save_subscriptions"] = m
+
+    logs = generate_redemption_logs(subscriptions, size)
+    with measure() as m:
+        bot._update_redemption_times(subscriptions, logs)
+    report["update_redemption_times"] = m
+
+    now = bot.chain.blocks.head.timestamp
+    rnd = random.Random(size)
+    redeem_times = {
+        (sub["sub_id"], sub["module"]): now + rnd.randint(0, blocks * BLOCK_TIME)
+        for sub in subscriptions
+    }
+    bot._update_redeem_times_db(redeem_times)
+    with measure() as m:
+        bot._seed_scheduler()
+    report["seed_scheduler"] = m
+
+    paths = [
+        [
+            bot.TransferStep(t["from"], t["to"], t["tokenOwner"], t["value"])
+            for t in generate_transfers(
+                sub["subscriber"],
+                sub["recipient"],
+                sub["amount"],
+                routes=pathfinder.routes,
+                hops=pathfinder.hops,
+                seed=i,
+            )
+        ]
+        for i, sub in enumerate(subscriptions[:samples])
+    ]
+    with measure() as m:
+        for sub, transfers in zip(subscriptions, paths):
+            bot.create_abi_flow_matrix(
+                sub["subscriber"], sub["recipient"], str(sub["amount"]), transfers
+            )
+    m.elapsed /= max(len(paths), 1)
+    report["create_abi_flow_matrix"] = m
+
+    latencies = []
+    requests = pathfinder.requests
+    with measure() as m:
+        for number in range(blocks):
+            block = generate_block(number, now + number * BLOCK_TIME)
+            started = time.perf_counter()
+            bot.handle_subscriptions(block)
+            latencies.append(time.perf_counter() - started)
+        bot.redemption_executor.shutdown(wait=True)
+    report["handle_subscriptions"] = m
+    report["handler_p50_ms"] = 1000 * statistics.median(latencies)
+    report["handler_p95_ms"] = 1000 * percentile(latencies, 0.95)
+    report["handler_max_ms"] = 1000 * max(latencies)
+    report["pathfinder_requests"] = pathfinder.requests - requests
+    report["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return report
+
+
+def print_report(report: Dict) -> None:
+    click.echo(f"\n== {report['size']:,} subscriptions ==")
+    for name in (
+        "save_subscriptions",
+        "update_redemption_times",
+        "seed_scheduler",
+        "create_abi_flow_matrix",
+        "handle_subscriptions",
+    ):
+        m = report[name]
+        peak = f"{m.peak_memory / 2**20:>8.1f} MiB peak" if TRACE_MEMORY else ""
+        click.echo(f"{name:<26} {1000 * m.elapsed:>10.2f} ms  {m.statements:>6} statements  {peak}")
+    click.echo(
+        f"handler latency per block  p50 {report['handler_p50_ms']:.2f} ms, "
+        f"p95 {report['handler_p95_ms']:.2f} ms, max {report['handler_max_ms']:.2f} ms, "
+        f"{report['pathfinder_requests']} pathfinder requests"
+    )
+    click.echo(f"process max RSS            {report['max_rss_mb']:.1f} MiB")
+
+
+@click.command()
+@click.option("--sizes", default="10000,100000", help="Comma-separated subscription counts.")
+@click.option("--blocks", default=20, help="Blocks to run handle_subscriptions for.")
+@click.option("--samples", default=200, help="Paths to build flow matrices for.")
+@click.option("--routes", default=3, help="Parallel routes per synthetic path.")
+@click.option("--hops", default=4, help="Transfer steps per route.")
+@click.option("--pathfinder-latency", default=0.0, help="Seconds the mock pathfinder waits.")
+@click.option("--tx-latency", default=0.0, help="Seconds the mock chain takes per transaction.")
+@click.option("--trace-memory", is_flag=True, help="Record peak allocations (slows timings).")
+@click.option("--json-output", type=click.Path(dir_okay=False), help="Also write results here.")
+@click.option("--keep-schema", is_flag=True, help=f"Keep the {BENCH_SCHEMA} schema afterwards.")
+def main(
+    sizes,
+    blocks,
+    samples,
+    routes,
+    hops,
+    pathfinder_latency,
+    tx_latency,
+    trace_memory,
+    json_output,
+    keep_schema,
+):
+    """Benchmark the bot's hot paths against synthetic data, fully offline.
+
+    Needs a scratch Postgres at DATABASE_URL; all tables live in a separate schema.
+    """
+    global TRACE_MEMORY
+
+    if not os.environ.get("DATABASE_URL"):
+        raise click.UsageError("DATABASE_URL must point at a scratch Postgres database")
+    TRACE_MEMORY = trace_memory
+
+    execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}", *SCHEMA_STATEMENTS)
+
+    pathfinder = MockPathfinder(routes=routes, hops=hops, latency=pathfinder_latency)
+    pathfinder.start()
+    os.environ["PATHFINDER_URL"] = pathfinder.url
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import bot
+
+    from pool import ConnectionPool
+
+    bot.bot.state = SimpleNamespace()
+    bot.db_pool = ConnectionPool(
+        bot.DATABASE_URL, maxconn=bot.DB_POOL_MAX_SIZE, connection_factory=CountingConnection
+    )
+
+    def send_transaction(txn):
+        time.sleep(tx_latency)
+
+    bot._send_transaction = send_transaction
+
+    reports = []
+    try:
+        for size in (int(size) for size in sizes.split(",")):
+            report = bench_size(bot, pathfinder, size, blocks, samples)
+            print_report(report)
+            reports.append(report)
+    finally:
+        bot.redemption_executor.shutdown(wait=True)
+        bot.pathfinder.close()
+        bot.db_pool.close()
+        if not keep_schema:
+            execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+
+    if json_output:
+        with open(json_output, "w") as f:
+            json.dump(
+                [
+                    {k: vars(v) if isinstance(v, Measurement) else v for k, v in report.items()}
+                    for report in reports
+                ],
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,189 +1,461 @@
+import json
 import os
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import click
-import pandas as pd
-import psycopg2
 import psycopg2.extras
-import psycopg2.pool
-import requests
-from ape import Contract, accounts, chain
+from ape import accounts, chain
+from ape.api import AccountAPI
+from ape.contracts import ContractInstance
+from ape.exceptions import ContractLogicError
 from ape.types import LogFilter
 from ape_accounts import import_account_from_private_key
+from ape_ethereum import multicall
+from eth_utils import to_checksum_address
+from ethpm_types import ContractType
 from silverback import SilverbackBot
 
+import metrics
+from balances import BalanceTracker
+from cache import PathCache
+from changefeed import ChangeFeed
+from executor import NonceManager, RedemptionExecutor
+from flowmatrix import TransferStep, create_abi_flow_matrix
+from indexer import EventIndexer
+from pathfinder import PathfinderClient, parse_transfers
+from payloads import PayloadStore
+from pool import ConnectionPool
+from preflight import GasCache, RedemptionReverted, classify_revert, load_error_selectors
+from scheduler import RedemptionScheduler, SubKey, Subscription
+from sharding import ShardLease
+from snapshot import SnapshotFile
+from trustgraph import TrustGraph
+
 # Instantiate bot
 bot = SilverbackBot()
 
-# Private key
+# Private key, imported into the keystore on first use by signer_account()
 ALIAS = os.environ.get("ALIAS")
 PASSPHRASE = os.environ.get("PASSPHRASE")
 PRIVATE_KEY = os.environ.get("PRIVATE_KEY")
-signer_account = import_account_from_private_key(ALIAS, PASSPHRASE, PRIVATE_KEY)
-signer_account.set_autosign(passphrase=PASSPHRASE, enabled=True)
 
 
 # Variables
-START_BLOCK = int(os.environ.get("START_BLOCK", chain.blocks.head.number))
+# Unset means the head block at the time the bot first finds no sync_status row
+START_BLOCK = int(os.environ["START_BLOCK"]) if os.environ.get("START_BLOCK") else None
 DATABASE_URL = os.getenv("DATABASE_URL")
+REDEMPTION_BATCH_LIMIT = int(os.environ.get("REDEMPTION_BATCH_LIMIT", 100))
+REDEMPTION_CONCURRENCY = int(os.environ.get("REDEMPTION_CONCURRENCY", 8))
+REDEMPTION_MAX_BATCH_SIZE = int(os.environ.get("REDEMPTION_MAX_BATCH_SIZE", 1))
+REDEMPTION_MAX_BATCH_GAS = int(os.environ.get("REDEMPTION_MAX_BATCH_GAS", 8_000_000))
+REDEMPTION_RETRY_BASE_DELAY = int(os.environ.get("REDEMPTION_RETRY_BASE_DELAY", 60))
+REDEMPTION_RETRY_MAX_DELAY = int(os.environ.get("REDEMPTION_RETRY_MAX_DELAY", 3600))
+REDEMPTION_QUARANTINE_AFTER = int(os.environ.get("REDEMPTION_QUARANTINE_AFTER", 8))
+REDEMPTION_LOOKAHEAD = int(os.environ.get("REDEMPTION_LOOKAHEAD", 120))
+REDEMPTION_LOOKAHEAD_LIMIT = int(os.environ.get("REDEMPTION_LOOKAHEAD_LIMIT", 50))
+REDEMPTION_PREFLIGHT = int(os.environ.get("REDEMPTION_PREFLIGHT", 0))
+REDEMPTION_GAS_MARGIN = float(os.environ.get("REDEMPTION_GAS_MARGIN", 1.25))
+REDEMPTION_BALANCE_PRECHECK_TTL = float(os.environ.get("REDEMPTION_BALANCE_PRECHECK_TTL", 3600))
+REDEMPTION_SHARDS = int(os.environ.get("REDEMPTION_SHARDS", 0))
+REDEMPTION_SHARD_HEARTBEAT = int(os.environ.get("REDEMPTION_SHARD_HEARTBEAT", 30))
+CONFIRMATION_DEPTH = int(os.environ.get("CONFIRMATION_DEPTH", 20))
+SYNC_COMMIT_BLOCKS = int(os.environ.get("SYNC_COMMIT_BLOCKS", 100))
+SYNC_COMMIT_INTERVAL = float(os.environ.get("SYNC_COMMIT_INTERVAL", 60))
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", 300))
+BACKFILL_CHUNK_SIZE = int(os.environ.get("BACKFILL_CHUNK_SIZE", 10_000))
+BACKFILL_CONCURRENCY = int(os.environ.get("BACKFILL_CONCURRENCY", 4))
+PATH_CACHE_SIZE = int(os.environ.get("PATH_CACHE_SIZE", 4096))
+PATH_CACHE_TTL = float(os.environ.get("PATH_CACHE_TTL", 120))
+PATH_CACHE_NEGATIVE_TTL = float(os.environ.get("PATH_CACHE_NEGATIVE_TTL", 60))
+PATHFINDER_URL = os.environ.get("PATHFINDER_URL", "https://rpc.aboutcircles.com/")
+PATHFINDER_TIMEOUT = float(os.environ.get("PATHFINDER_TIMEOUT", 10))
+PATHFINDER_MAX_RETRIES = int(os.environ.get("PATHFINDER_MAX_RETRIES", 2))
+PATHFINDER_CONCURRENCY = int(os.environ.get("PATHFINDER_CONCURRENCY", 4))
+PATHFINDER_BATCH_SIZE = int(os.environ.get("PATHFINDER_BATCH_SIZE", 50))
+LOCAL_PATHFINDER = os.environ.get("LOCAL_PATHFINDER", "off").lower()  # off, fallback or primary
+LOCAL_PATHFINDER_MAX_HOPS = int(os.environ.get("LOCAL_PATHFINDER_MAX_HOPS", 4))
+TRUST_GRAPH_PATH = os.environ.get("TRUST_GRAPH_PATH", "")
+TRUST_GRAPH_START_BLOCK = int(os.environ.get("TRUST_GRAPH_START_BLOCK", 0))
+TRUST_GRAPH_SAVE_INTERVAL = float(os.environ.get("TRUST_GRAPH_SAVE_INTERVAL", 600))
+TRUST_GRAPH_SYNC_BUDGET = float(os.environ.get("TRUST_GRAPH_SYNC_BUDGET", 30))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_ADDR = os.environ.get("METRICS_ADDR", "127.0.0.1")
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+CHANGE_FEED = int(os.environ.get("CHANGE_FEED", 1))
 
 # Addresses
 HUB_ADDRESS = "0xc12C1E50ABB450d6205Ea2C3Fa861b3B834d13e8"
 SUBSCRIPTION_MANAGER_ADDRESS = "0x7E9BaF7CC7cD83bACeFB9B2D5c5124C0F9c30834"
 
-# Contracts
-hub = Contract(HUB_ADDRESS, abi="abi/Hub.json")
-subscription_manager = Contract(SUBSCRIPTION_MANAGER_ADDRESS, abi="abi/SubscriptionManager.json")
-
-
-# DB helpers that work with both temp connections and pools
-def _get_db_connection():
-    """Get a fresh database connection."""
-    return psycopg2.connect(DATABASE_URL)
-
 
+# Contracts, built from their ABIs so no code or proxy lookups go to the chain at import
+def _contract(address: str, abi_path: str) -> ContractInstance:
+    with open(abi_path) as f:
+        return ContractInstance(address, ContractType(abi=json.load(f)))
+
+
+hub = _contract(HUB_ADDRESS, "abi/Hub.json")
+subscription_manager = _contract(SUBSCRIPTION_MANAGER_ADDRESS, "abi/SubscriptionManager.json")
+
+# Reverts bubble up from the module and the Hub, whose errors the manager ABI doesn't declare
+REVERT_SELECTORS = load_error_selectors("abi/SubscriptionModule.json", "abi/Hub.json")
+
+# Tags this process's DB sessions, so it can tell its own changes apart in the change feed
+DB_APPLICATION_NAME = f"subi-{uuid.uuid4().hex[:12]}"
+
+# Postgres connections, opened lazily on first use
+db_pool = ConnectionPool(
+    DATABASE_URL,
+    minconn=DB_POOL_MIN_SIZE,
+    maxconn=DB_POOL_MAX_SIZE,
+    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+    application_name=DB_APPLICATION_NAME,
+)
+
+# Changes other replicas make to `subscriptions`, pushed by Postgres; off unless CHANGE_FEED is 1
+change_feed = ChangeFeed(
+    DATABASE_URL,
+    origin=DB_APPLICATION_NAME,
+    on_change=lambda change: _apply_subscription_change(change),
+    on_resync=lambda: _resync_scheduler(),
+)
+
+# Subscription logs from the last CONFIRMATION_DEPTH blocks, recorded so reorgs can be undone
+indexer = EventIndexer(
+    db_pool,
+    block_hash=lambda number: chain.blocks[number].hash,
+    confirmations=CONFIRMATION_DEPTH,
+    commit_blocks=SYNC_COMMIT_BLOCKS,
+    commit_interval=SYNC_COMMIT_INTERVAL,
+)
+
+# Scheduler state on disk for cold starts without a full table read; off unless SNAPSHOT_PATH is set
+snapshot_file = SnapshotFile(
+    SNAPSHOT_PATH, chain_id=lambda: chain.chain_id, interval=SNAPSHOT_INTERVAL
+)
+
+# Pathfinder JSON-RPC client, batching every query of a block into as few requests as possible
+pathfinder = PathfinderClient(
+    PATHFINDER_URL,
+    timeout=PATHFINDER_TIMEOUT,
+    max_retries=PATHFINDER_MAX_RETRIES,
+    max_concurrency=PATHFINDER_CONCURRENCY,
+    max_batch_size=PATHFINDER_BATCH_SIZE,
+)
+
+# Pathfinder results, evicted early by Hub trust and transfer events
+path_cache = PathCache(
+    maxsize=PATH_CACHE_SIZE, ttl=PATH_CACHE_TTL, negative_ttl=PATH_CACHE_NEGATIVE_TTL
+)
+
+# Hub trust and balances from final blocks, for max-flow search without the remote pathfinder;
+# only synced when LOCAL_PATHFINDER is fallback or primary
+trust_graph = TrustGraph(max_hops=LOCAL_PATHFINDER_MAX_HOPS)
+trust_graph.block_number = TRUST_GRAPH_START_BLOCK - 1
+trust_graph_ready = threading.Event()
+trust_graph_sync = ThreadPoolExecutor(max_workers=1)
+_trust_graph_lock = threading.Lock()
+
+# redeemPayment arguments built and simulated up to REDEMPTION_LOOKAHEAD seconds before redeem_at
+payload_store = PayloadStore()
+
+# Subscribers the pathfinder found unable to pay, re-checked against Hub balances once per block
+balance_tracker = BalanceTracker(
+    lambda owners, ids: hub.balanceOfBatch([to_checksum_address(o) for o in owners], ids),
+    mark_ttl=REDEMPTION_BALANCE_PRECHECK_TTL,
+)
+
+# In-process redemption queue; Postgres is only written through for durability
+scheduler = RedemptionScheduler(
+    retry_base_delay=REDEMPTION_RETRY_BASE_DELAY,
+    retry_max_delay=REDEMPTION_RETRY_MAX_DELAY,
+    quarantine_after=REDEMPTION_QUARANTINE_AFTER,
+)
+
+# Replicas sharing DATABASE_URL split subscriptions between them; off unless REDEMPTION_SHARDS > 0
+shard_lease = ShardLease(
+    DATABASE_URL, shard_count=REDEMPTION_SHARDS, heartbeat_interval=REDEMPTION_SHARD_HEARTBEAT
+)
+
+# redeemPayment gas limits by flow-matrix shape, used in REDEMPTION_PREFLIGHT mode
+gas_cache = GasCache(margin=REDEMPTION_GAS_MARGIN)
+
+# Redemption workers share one nonce sequence for the signer account
+nonce_manager = NonceManager(
+    lambda: accounts.provider.get_nonce(signer_account().address, block_id="pending")
+)
+redemption_executor = RedemptionExecutor(
+    max_workers=REDEMPTION_CONCURRENCY, max_pending=REDEMPTION_BATCH_LIMIT
+)
+
+
+_signer: Optional[AccountAPI] = None
+_signer_lock = threading.Lock()
+
+
+def signer_account() -> AccountAPI:
+    """Account redemptions are sent from, imported on first use since unlocking it is slow."""
+    global _signer
+    with _signer_lock:
+        if _signer is None:
+            _signer = import_account_from_private_key(ALIAS, PASSPHRASE, PRIVATE_KEY)
+            _signer.set_autosign(passphrase=PASSPHRASE, enabled=True)
+        return _signer
+
+
+def _start_block() -> int:
+    return START_BLOCK if START_BLOCK is not None else chain.blocks.head.number
+
+
+# DB helpers, all sharing the process-wide connection pool
+@metrics.DB_SECONDS.labels("load_block").time()
 def _load_block_db() -> int:
-    """Load last processed block from DB, fallback to START_BLOCK."""
-    conn = _get_db_connection()
+    """Load last processed block from DB, fallback to START_BLOCK or the head block."""
     try:
-        with conn.cursor() as cur:
+        with db_pool.connection() as conn, conn.cursor() as cur:
             cur.execute("SELECT last_synced_block FROM sync_status WHERE name = 'main'")
             row = cur.fetchone()
-            return int(row[0]) if row else START_BLOCK
+            block_number = int(row[0]) if row else _start_block()
+        metrics.record_synced_block(block_number)
+        return block_number
     except Exception as e:
         click.echo(f"[DB] Failed to load sync block: {e}")
-        return START_BLOCK
-    finally:
-        conn.close()
+        return _start_block()
+
+
+def _set_sync_block(cur, block_number: int) -> None:
+    # Replaying from an older snapshot re-applies blocks below the cursor; never move it back
+    cur.execute(
+        """
+        INSERT INTO sync_status (name, last_synced_block)
+        VALUES ('main', %s)
+        ON CONFLICT (name) DO UPDATE SET last_synced_block =
+            GREATEST(sync_status.last_synced_block, EXCLUDED.last_synced_block)
+        """,
+        (block_number,),
+    )
 
 
-def _save_block_db(block_number: int) -> bool:
-    """Save the last processed block to sync_status."""
-    conn = _get_db_connection()
+@metrics.DB_SECONDS.labels("load_subscriptions").time()
+def _load_subscriptions_db() -> List[Dict]:
+    """Load every subscription row as a dict."""
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO sync_status (name, last_synced_block)
-                VALUES ('main', %s)
-                ON CONFLICT (name) DO UPDATE SET last_synced_block = EXCLUDED.last_synced_block
-                """,
-                (block_number,),
-            )
+        with db_pool.connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute("SELECT * FROM subscriptions")
+                return cur.fetchall()
+    except Exception as e:
+        click.echo(f"DB error loading subscriptions: {e}")
+        return []
+
+
+def _subscription_row(sub: Dict) -> Tuple:
+    """Column tuple for a subscription dict, in `subscriptions` table order."""
+    return (
+        int(sub["sub_id"]),
+        str(sub["module"]),
+        str(sub["subscriber"]),
+        str(sub["recipient"]),
+        int(sub["amount"]),
+        int(sub["frequency"]),
+        int(sub["redeem_at"]),
+        int(sub.get("created_block", sub.get("block_number", 0))),
+    )
+
+
+def _upsert_subscriptions(cur, subscriptions: List[Dict]) -> None:
+    """Upsert the given subscriptions, sending them as multi-row INSERTs via execute_values."""
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO subscriptions (
+            sub_id, module, subscriber, recipient,
+            amount, frequency, redeem_at, created_block
+        )
+        VALUES %s
+        ON CONFLICT (sub_id, module) DO UPDATE SET
+            subscriber = EXCLUDED.subscriber,
+            recipient = EXCLUDED.recipient,
+            amount = EXCLUDED.amount,
+            frequency = EXCLUDED.frequency,
+            redeem_at = EXCLUDED.redeem_at,
+            created_block = EXCLUDED.created_block
+        """,
+        [_subscription_row(sub) for sub in subscriptions],
+        page_size=1000,
+    )
+
+
+@metrics.DB_SECONDS.labels("save_subscriptions").time()
+def _save_subscriptions_db(subscriptions: List[Dict]) -> bool:
+    """Upsert the given subscriptions in one transaction."""
+    if not subscriptions:
+        return True
+
+    try:
+        with db_pool.connection() as conn:
+            with conn.cursor() as cur:
+                _upsert_subscriptions(cur, subscriptions)
             conn.commit()
         return True
     except Exception as e:
-        click.echo(f"[DB] Failed to save sync block: {e}")
-        conn.rollback()
+        click.echo(f"DB error saving subscriptions: {e}")
         return False
-    finally:
-        conn.close()
 
 
-def _load_subscriptions_db() -> pd.DataFrame:
-    """Load subscriptions into a DataFrame."""
-    conn = _get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT * FROM subscriptions")
-            rows = cur.fetchall()
-            return pd.DataFrame(rows)
-    except Exception as e:
-        click.echo(f"DB error loading subscriptions: {e}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+def _set_redeem_times(cur, redeem_times: Dict[Tuple[int, str], int]) -> None:
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        UPDATE subscriptions AS s SET redeem_at = v.redeem_at
+        FROM (VALUES %s) AS v (sub_id, module, redeem_at)
+        WHERE s.sub_id = v.sub_id AND s.module = v.module
+        """,
+        [(*key, redeem_at) for key, redeem_at in redeem_times.items()],
+        page_size=1000,
+    )
 
 
-def _save_subscriptions_db(df: pd.DataFrame) -> bool:
-    """Upsert subscription entries into the database."""
-    if df.empty:
+@metrics.DB_SECONDS.labels("update_redeem_times").time()
+def _update_redeem_times_db(redeem_times: Dict[Tuple[int, str], int]) -> bool:
+    """Set redeem_at for many subscriptions in one UPDATE, keyed by (sub_id, module)."""
+    if not redeem_times:
         return True
 
-    conn = _get_db_connection()
     try:
-        with conn.cursor() as cur:
-            data = []
-            for _, row in df.iterrows():
-                data.append(
-                    (
-                        int(row["sub_id"]),
-                        str(row["module"]),
-                        str(row["subscriber"]),
-                        str(row["recipient"]),
-                        int(row["amount"]),
-                        int(row["frequency"]),
-                        int(row["redeem_at"]),
-                        int(row.get("created_block", row.get("block_number", 0))),
-                    )
-                )
-
-            cur.executemany(
-                """
-                INSERT INTO subscriptions (
-                    sub_id, module, subscriber, recipient,
-                    amount, frequency, redeem_at, created_block
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (sub_id, module) DO UPDATE SET
-                    subscriber = EXCLUDED.subscriber,
-                    recipient = EXCLUDED.recipient,
-                    amount = EXCLUDED.amount,
-                    frequency = EXCLUDED.frequency,
-                    redeem_at = EXCLUDED.redeem_at,
-                    created_block = EXCLUDED.created_block
-                """,
-                data,
-            )
+        with db_pool.connection() as conn:
+            with conn.cursor() as cur:
+                _set_redeem_times(cur, redeem_times)
             conn.commit()
         return True
     except Exception as e:
-        click.echo(f"DB error saving subscriptions: {e}")
-        conn.rollback()
+        click.echo(f"DB error updating redeem_at for {len(redeem_times)} subscriptions: {e}")
         return False
-    finally:
-        conn.close()
 
 
-# Historical events helper functions
-def _get_historical_subscription_creations(
-    start_block: int,
-    stop_block: int = chain.blocks.head.number,
-):
-    """Get historical SubscriptionCreated events from SubscriptionManager"""
-    log_filter = LogFilter(
-        addresses=[subscription_manager.address],
-        events=[subscription_manager.SubscriptionCreated.abi],
-        start_block=start_block,
-        stop_block=stop_block,
-    )
+def _seed_scheduler() -> None:
+    """Queue every stored subscription in the in-process scheduler."""
+    for row in _load_subscriptions_db():
+        scheduler.schedule(_subscription_from_row(row))
 
-    for log in accounts.provider.get_contract_logs(log_filter):
-        yield log
+    click.echo(f"Scheduler seeded with {len(scheduler)} subscriptions")
 
 
-def _get_historical_redemptions(
-    start_block: int,
-    stop_block: int = chain.blocks.head.number,
-):
-    """Get historical Redeemed events from SubscriptionManager"""
+def _apply_subscription_change(change: Dict) -> None:
+    """Mirror a change another process made to `subscriptions` into the scheduler."""
+    key = (int(change["sub_id"]), str(change["module"]))
+    if change["op"] == "d":
+        scheduler.remove(*key)
+    elif change["op"] == "r":
+        scheduler.reschedule(*key, int(change["redeem_at"]))
+    else:
+        scheduler.schedule(_subscription_from_row(change))
+
+
+@metrics.DB_SECONDS.labels("resync_subscriptions").time()
+def _resync_scheduler() -> None:
+    """Bring the scheduler in line with `subscriptions` after change notifications were missed."""
+    with db_pool.connection() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(
+                """
+                SELECT sub_id, module, subscriber, recipient, amount, frequency, redeem_at
+                FROM subscriptions
+                """
+            )
+            rows = {(row["sub_id"], row["module"]): row for row in cur.fetchall()}
+
+    for sub in scheduler.subscriptions():
+        if sub.key not in rows:
+            scheduler.remove(*sub.key)
+    for key, row in rows.items():
+        sub = scheduler.get(*key)
+        if sub is None:
+            scheduler.schedule(_subscription_from_row(row))
+        elif sub.redeem_at != int(row["redeem_at"]):
+            scheduler.reschedule(*key, int(row["redeem_at"]))
+
+    click.echo(f"[ChangeFeed] Resynced scheduler with {len(rows)} subscriptions")
+
+
+def _subscription_from_row(row: Dict) -> Subscription:
+    return Subscription(
+        sub_id=int(row["sub_id"]),
+        module=str(row["module"]),
+        subscriber=str(row["subscriber"]),
+        recipient=str(row["recipient"]),
+        amount=int(row["amount"]),
+        frequency=int(row["frequency"]),
+        redeem_at=int(row["redeem_at"]),
+    )
+
+
+# Historical events helper functions
+# Substrings providers use when a getLogs range returns too many results or spans too many blocks
+_LOG_RANGE_ERRORS = (
+    "too many",
+    "more than",
+    "limit exceeded",
+    "response size",
+    "block range",
+    "range too large",
+    "query timeout",
+)
+
+
+def _is_log_range_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in _LOG_RANGE_ERRORS)
+
+
+def _get_contract_logs(
+    address: str, events: List, start_block: int, stop_block: int
+) -> Tuple[List, int]:
+    """Get logs of the `events` ABIs emitted by `address` in one filter pass.
+
+    Ranges the provider rejects as too large are halved until they fit. Returns the logs plus the
+    largest range size that was accepted, so callers can adapt their chunk size.
+    """
     log_filter = LogFilter(
-        addresses=[subscription_manager.address],
-        events=[subscription_manager.Redeemed.abi],
-        start_block=start_block,
-        stop_block=stop_block,
+        addresses=[address], events=events, start_block=start_block, stop_block=stop_block
     )
 
-    for log in accounts.provider.get_contract_logs(log_filter):
-        yield log
+    try:
+        return list(accounts.provider.get_contract_logs(log_filter)), stop_block - start_block + 1
+    except Exception as e:
+        if start_block == stop_block or not _is_log_range_error(e):
+            raise
+
+    middle = (start_block + stop_block) // 2
+    click.echo(f"[Backfill] Blocks {start_block}-{stop_block} rejected by provider, splitting")
+    first_logs, first_size = _get_contract_logs(address, events, start_block, middle)
+    second_logs, second_size = _get_contract_logs(address, events, middle + 1, stop_block)
+    return first_logs + second_logs, min(first_size, second_size)
+
+
+def _get_historical_subscription_logs(start_block: int, stop_block: int) -> Tuple[List, int]:
+    """Get SubscriptionCreated and Redeemed events in one filter pass."""
+    return _get_contract_logs(
+        subscription_manager.address,
+        [subscription_manager.SubscriptionCreated.abi, subscription_manager.Redeemed.abi],
+        start_block,
+        stop_block,
+    )
 
 
-def _process_subscription_creation_logs(start_block: int, stop_block: int) -> List[Dict]:
+def _process_subscription_creation_logs(logs: List) -> List[Dict]:
     """Process subscription creation logs and return list of subscription dicts"""
     subscriptions = []
 
-    for log in _get_historical_subscription_creations(start_block, stop_block):
+    for log in logs:
         subscription = {
             "block_number": log.block_number,
             "sub_id": log.subId,
@@ -204,268 +476,489 @@ def _process_subscription_creation_logs(start_block: int, stop_block: int) -> Li
     return subscriptions
 
 
-def _update_redemption_times(subscriptions: List[Dict], start_block: int, stop_block: int) -> None:
-    """Update redeem_at times for subscriptions based on redemption events"""
-    for log in _get_historical_redemptions(start_block, stop_block):
-        for sub in subscriptions:
-            if sub["sub_id"] == log.subId and sub["module"] == log.module:
-                sub["redeem_at"] = log.nextRedeemAt
-                break
+def _update_redemption_times(subscriptions: List[Dict], logs: List) -> Dict[Tuple[int, str], int]:
+    """Update redeem_at times for subscriptions based on redemption events.
 
+    Events are matched through a (sub_id, module) index and must be in (block, log index) order so
+    the latest nextRedeemAt wins. Returns the final redeem_at for redeemed subscriptions that are
+    not in `subscriptions`.
+    """
+    index = {(sub["sub_id"], sub["module"]): sub for sub in subscriptions}
+    existing_redeem_times = {}
 
-def _process_historical_subscription_creations(start_block: int, stop_block: int) -> None:
-    """Process historical subscription creation events and store in database"""
-    subscriptions_df = _load_subscriptions_db()
+    for log in logs:
+        key = (log.subId, log.module)
+        if key in index:
+            index[key]["redeem_at"] = log.nextRedeemAt
+        else:
+            existing_redeem_times[key] = log.nextRedeemAt
+
+    return existing_redeem_times
 
-    subscriptions = _process_subscription_creation_logs(start_block, stop_block)
-    _update_redemption_times(subscriptions, start_block, stop_block)
+
+@metrics.DB_SECONDS.labels("apply_chunk").time()
+def _apply_historical_logs(logs: List, stop_block: int) -> None:
+    """Apply one backfill chunk and advance sync_status to `stop_block` in a single transaction.
+
+    Subscriptions created in `logs` are stored and the redemptions they contain applied. A chunk
+    is either fully applied with the cursor past it, or not at all and fetched again next start.
+    """
+    logs = sorted(logs, key=lambda log: (log.block_number, log.log_index))
+
+    subscriptions = _process_subscription_creation_logs(
+        [log for log in logs if log.event_name == "SubscriptionCreated"]
+    )
+    existing_redeem_times = _update_redemption_times(
+        subscriptions, [log for log in logs if log.event_name == "Redeemed"]
+    )
 
     if subscriptions:
         click.echo(f"Found {len(subscriptions)} historical subscription creations")
-        updated_df = pd.concat([subscriptions_df, pd.DataFrame(subscriptions)], ignore_index=True)
-        _save_subscriptions_db(updated_df)
-    else:
-        click.echo(f"No historical subscription creations found in blocks {start_block}-{stop_block}")
 
+    with db_pool.connection() as conn:
+        with conn.cursor() as cur:
+            if subscriptions:
+                _upsert_subscriptions(cur, subscriptions)
+            # Redemptions of subscriptions created before this chunk are already in the table
+            if existing_redeem_times:
+                _set_redeem_times(cur, existing_redeem_times)
+            _set_sync_block(cur, stop_block)
+        conn.commit()
+    metrics.record_synced_block(stop_block)
+
+    # Keeps a scheduler seeded from a snapshot current; otherwise it is seeded from the table later
+    for sub in subscriptions:
+        scheduler.schedule(_subscription_from_row(sub))
+    for (sub_id, module), redeem_at in existing_redeem_times.items():
+        scheduler.reschedule(sub_id, module, redeem_at)
 
-def _catch_up_subscription_creations(current_block: int) -> None:
-    """Catch up on SubscriptionCreated events from last processed block"""
-    last_processed_block = _load_block_db()
 
-    if current_block <= last_processed_block:
-        return
+def _process_historical_subscription_creations(start_block: int, stop_block: int) -> None:
+    """Backfill subscription events in [start_block, stop_block] into the database.
+
+    The range is fetched in chunks of up to BACKFILL_CHUNK_SIZE blocks, BACKFILL_CONCURRENCY at a
+    time. Chunk size shrinks to whatever the provider last accepted and grows back after a clean
+    round. Chunks are applied in block order and sync_status is checkpointed after each one, so an
+    interrupted backfill resumes from the last applied chunk instead of from `start_block`.
+    """
+    chunk_size = BACKFILL_CHUNK_SIZE
+    next_block = start_block
+
+    with ThreadPoolExecutor(max_workers=BACKFILL_CONCURRENCY) as pool:
+        while next_block <= stop_block:
+            ranges = []
+            while next_block <= stop_block and len(ranges) < BACKFILL_CONCURRENCY:
+                chunk_stop = min(next_block + chunk_size - 1, stop_block)
+                ranges.append((next_block, chunk_stop))
+                next_block = chunk_stop + 1
+
+            accepted_size = chunk_size
+            results = pool.map(lambda r: _get_historical_subscription_logs(*r), ranges)
+            for (chunk_start, chunk_stop), (logs, size) in zip(ranges, results):
+                _apply_historical_logs(logs, chunk_stop)
+                accepted_size = min(accepted_size, size)
+                click.echo(
+                    f"[Backfill] Applied {len(logs)} logs from blocks {chunk_start}-{chunk_stop}"
+                )
 
-    click.echo(f"Catching up subscriptions from block {last_processed_block + 1} to {current_block}")
-    _process_historical_subscription_creations(start_block=last_processed_block + 1, stop_block=current_block)
+            if accepted_size < chunk_size:
+                chunk_size = accepted_size
+            else:
+                chunk_size = min(chunk_size * 2, BACKFILL_CHUNK_SIZE)
+
+
+# Reorg-safe indexing of unconfirmed blocks
+def _index_logs(logs: List, after: Optional[int] = None) -> None:
+    """Apply logs through the indexer and mirror the ones applied into the scheduler.
+
+    With `after`, `logs` replace the events recorded above that block and are all applied again.
+    """
+    applied = indexer.apply(logs) if after is None else indexer.reindex(after, logs)
+    for log in applied:
+        if log.event_name == "SubscriptionCreated":
+            scheduler.schedule(
+                Subscription(
+                    sub_id=int(log.subId),
+                    module=str(log.module),
+                    subscriber=str(log.subscriber),
+                    recipient=str(log.recipient),
+                    amount=int(log.amount),
+                    frequency=int(log.frequency),
+                    redeem_at=0,
+                )
+            )
+            click.echo(f"Sub {log.subId} created on {log.module}")
+        else:
+            scheduler.reschedule(log.subId, log.module, log.nextRedeemAt)
+            click.echo(
+                f"Redemption completed {log.subId} on module {log.module}, "
+                f"next redeem: {log.nextRedeemAt}"
+            )
 
 
-# Subscription processing helper functions
-def _get_sub_module_pairs_from_df(subscriptions_df: pd.DataFrame) -> List[Tuple[int, str]]:
-    """Extract unique (sub_id, module) pairs from dataframe"""
-    return list(subscriptions_df[["sub_id", "module"]].drop_duplicates().itertuples(index=False, name=None))
+def _roll_back_to(ancestor: int, head: int) -> None:
+    """Undo indexed events above `ancestor` and re-apply (ancestor, head] from the new chain."""
+    metrics.REORGS.inc()
+    click.echo(f"[Indexer] Reorg below block {head}, rolling back to block {ancestor}")
 
+    _restore_scheduler(indexer.rollback(ancestor))
 
-# Pathfinder and flow matrix utilities
-@dataclass
-class TransferStep:
-    """Represents a single transfer step in a payment flow."""
+    if head > ancestor:
+        logs, _ = _get_historical_subscription_logs(ancestor + 1, head)
+        _index_logs(logs)
 
-    from_address: str
-    to_address: str
-    token_owner: str
-    value: str
 
+def _restore_scheduler(rows: Dict[SubKey, Optional[Dict]]) -> None:
+    """Bring scheduled subscriptions in line with their rows, dropping deleted ones."""
+    for key, row in rows.items():
+        if row is None:
+            scheduler.remove(*key)
+        else:
+            scheduler.schedule(_subscription_from_row(row))
 
-@dataclass
-class FlowEdge:
-    """Represents an edge in the flow graph."""
 
-    stream_sink_id: int
-    amount: str
+def _advance_sync_cursor(head: int, force: bool = False) -> Optional[int]:
+    """Commit sync_status up to the last final block if a commit is due, return the new cursor."""
+    try:
+        synced_block = indexer.finalize(head, force=force)
+    except Exception as e:
+        click.echo(f"[DB] Failed to save sync block: {e}")
+        return None
 
+    if synced_block is not None:
+        metrics.record_synced_block(synced_block)
+    return synced_block
 
-@dataclass
-class Stream:
-    """Represents a stream in the flow matrix."""
 
-    source_coordinate: int
-    flow_edge_ids: List[int]
-    data: bytes
+def _write_snapshot(synced_block: int) -> None:
+    """Save every scheduled subscription, tagged with the sync cursor they are current from."""
+    started = time.monotonic()
+    subscriptions = scheduler.subscriptions()
+    try:
+        snapshot_file.write(synced_block, subscriptions)
+    except OSError as e:
+        click.echo(f"[Snapshot] Failed to write {snapshot_file.path}: {e}")
+        return
 
+    click.echo(
+        f"[Snapshot] Saved {len(subscriptions)} subscriptions at block {synced_block} "
+        f"in {time.monotonic() - started:.2f}s"
+    )
 
-@dataclass
-class FlowMatrix:
-    """Complete flow matrix for ABI encoding."""
 
-    flow_vertices: List[str]
-    flow_edges: List[FlowEdge]
-    streams: List[Stream]
-    packed_coordinates: bytes
-    source_coordinate: int
+# Local trust graph
+def _sync_trust_graph(head: int) -> None:
+    """Apply Hub trust and transfer logs from final blocks the trust graph hasn't seen yet.
 
+    Only final blocks are applied, so the graph never has to be rolled back. Each call works for
+    at most TRUST_GRAPH_SYNC_BUDGET seconds and the next block's call picks up from there, so a
+    long first sync doesn't hold up shutdown.
+    """
+    if not _trust_graph_lock.acquire(blocking=False):
+        return
 
-def pack_coordinates(coords: List[int]) -> bytes:
-    """Pack a uint16 array into bytes (big-endian, no padding)."""
-    result = bytearray(len(coords) * 2)
+    try:
+        stop_block = indexer.finalized_block(head)
+        deadline = time.monotonic() + TRUST_GRAPH_SYNC_BUDGET
+        chunk_size = BACKFILL_CHUNK_SIZE
+        while trust_graph.block_number < stop_block and time.monotonic() < deadline:
+            start_block = trust_graph.block_number + 1
+            chunk_stop = min(start_block + chunk_size - 1, stop_block)
+            logs, size = _get_contract_logs(
+                hub.address,
+                [hub.Trust.abi, hub.TransferSingle.abi, hub.TransferBatch.abi],
+                start_block,
+                chunk_stop,
+            )
+            # Demurrage is counted from the start of the chunk, erring towards lower balances
+            trust_graph.apply_logs(logs, chunk_stop, chain.blocks[start_block].timestamp)
+            metrics.TRUST_GRAPH_BLOCK.set(chunk_stop)
+            chunk_size = size if size < chunk_size else min(chunk_size * 2, BACKFILL_CHUNK_SIZE)
+            if logs:
+                click.echo(
+                    f"[TrustGraph] Applied {len(logs)} Hub logs from blocks "
+                    f"{start_block}-{chunk_stop}"
+                )
 
-    for i, coord in enumerate(coords):
-        hi = (coord >> 8) & 0xFF
-        lo = coord & 0xFF
-        offset = 2 * i
-        result[offset] = hi
-        result[offset + 1] = lo
+        if trust_graph.block_number >= stop_block and not trust_graph_ready.is_set():
+            trust_graph_ready.set()
+            click.echo(
+                f"[TrustGraph] Caught up at block {trust_graph.block_number} "
+                f"with {len(trust_graph)} balances"
+            )
+        if TRUST_GRAPH_PATH and trust_graph.save_due(TRUST_GRAPH_SAVE_INTERVAL):
+            _save_trust_graph()
+    except Exception as e:
+        click.echo(f"[TrustGraph] Sync stopped at block {trust_graph.block_number}: {e}")
+    finally:
+        _trust_graph_lock.release()
 
-    return bytes(result)
 
+def _save_trust_graph() -> None:
+    try:
+        trust_graph.save(TRUST_GRAPH_PATH)
+    except OSError as e:
+        click.echo(f"[TrustGraph] Failed to write {TRUST_GRAPH_PATH}: {e}")
+        return
+    click.echo(f"[TrustGraph] Saved graph at block {trust_graph.block_number}")
 
-def transform_to_flow_vertices(
-    transfers: List[TransferStep], from_addr: str, to_addr: str
-) -> Tuple[List[str], Dict[str, int]]:
-    """Build a sorted vertex list plus index lookup for quick coordinate mapping."""
-    addresses = {from_addr.lower(), to_addr.lower()}
 
-    for transfer in transfers:
-        addresses.add(transfer.from_address.lower())
-        addresses.add(transfer.to_address.lower())
-        addresses.add(transfer.token_owner.lower())
+def _catch_up_subscription_creations(current_block: int) -> None:
+    """Catch up on SubscriptionCreated events from last processed block"""
+    last_processed_block = _load_block_db()
 
-    sorted_addresses = sorted(addresses, key=lambda addr: int(addr, 16))
-    idx = {addr: i for i, addr in enumerate(sorted_addresses)}
+    if current_block <= last_processed_block:
+        return
 
-    return sorted_addresses, idx
+    click.echo(f"Catching up subscriptions from block {last_processed_block + 1} to {current_block}")
+    _process_historical_subscription_creations(start_block=last_processed_block + 1, stop_block=current_block)
 
 
-def create_flow_matrix(from_addr: str, to_addr: str, value: str, transfers: List[TransferStep]) -> Optional[FlowMatrix]:
-    """Create flow matrix, return None on validation failure"""
-    sender = from_addr.lower()
-    receiver = to_addr.lower()
+# Pathfinder and flow matrix utilities
+def find_circles_path_and_parse(
+    source: str, sink: str, target_flow: str, with_wrap: bool = True
+) -> Optional[List[TransferStep]]:
+    """Find a payment path, empty if there is none and None if the pathfinder didn't answer"""
+    return find_circles_paths_and_parse([(source, sink, target_flow, with_wrap)])[0]
 
-    flow_vertices, idx = transform_to_flow_vertices(transfers, sender, receiver)
 
-    flow_edges = []
+def _cache_path(cache_key: Tuple, source: str, sink: str, transfers: List[TransferStep]) -> None:
+    addresses = [source, sink]
     for transfer in transfers:
-        is_terminal = transfer.to_address.lower() == receiver
-        flow_edges.append(FlowEdge(stream_sink_id=1 if is_terminal else 0, amount=transfer.value))
+        addresses.extend((transfer.from_address, transfer.to_address, transfer.token_owner))
+    path_cache.put(cache_key, transfers, addresses)
 
-    has_terminal_edge = any(edge.stream_sink_id == 1 for edge in flow_edges)
-    if not has_terminal_edge:
-        to_addresses = [t.to_address.lower() for t in transfers]
-        try:
-            last_edge_index = len(to_addresses) - 1 - to_addresses[::-1].index(receiver)
-        except ValueError:
-            last_edge_index = -1
 
-        fallback_index = last_edge_index if last_edge_index != -1 else len(flow_edges) - 1
-        flow_edges[fallback_index].stream_sink_id = 1
+def _find_local_path(source: str, sink: str, target_flow: str) -> List[TransferStep]:
+    """Max-flow path over the local trust graph; empty unless it carries all of `target_flow`."""
+    with metrics.LOCAL_PATHFINDER_SECONDS.time():
+        result = trust_graph.find_path(source, sink, int(target_flow))
+    if int(result["maxFlow"]) < int(target_flow):
+        return []
+    return parse_transfers(result)
+
+
+def find_circles_paths_and_parse(
+    queries: List[Tuple[str, str, str, bool]],
+) -> List[Optional[List[TransferStep]]]:
+    """Find payment paths for (source, sink, target_flow, with_wrap) queries in one batch.
+
+    Returns one list of transfer steps per query, empty if there is no path and None if the
+    pathfinder couldn't be asked (transport or JSON-RPC errors) and nothing else found one. Cached answers are served
+    locally and only the misses are sent to the pathfinder. Once the trust graph has caught up,
+    LOCAL_PATHFINDER=primary searches it first and only asks the pathfinder about queries it
+    can't pay in full; LOCAL_PATHFINDER=fallback searches it for queries the pathfinder failed
+    or found no path for.
+    """
+    cache_keys = [
+        (source.lower(), sink.lower(), target_flow, with_wrap)
+        for source, sink, target_flow, with_wrap in queries
+    ]
+    results = [path_cache.get(cache_key) for cache_key in cache_keys]
+    misses = [i for i, cached in enumerate(results) if cached is None]
+
+    local = LOCAL_PATHFINDER != "off" and trust_graph_ready.is_set()
+    if local and LOCAL_PATHFINDER == "primary":
+        for i in misses:
+            source, sink, target_flow, _ = queries[i]
+            transfers = _find_local_path(source, sink, target_flow)
+            if transfers:
+                _cache_path(cache_keys[i], source, sink, transfers)
+                results[i] = transfers
+        misses = [i for i in misses if results[i] is None]
+    if not misses:
+        return results
+
+    params = []
+    for i in misses:
+        source, sink, target_flow, with_wrap = queries[i]
+        params.append(
+            {"Source": source, "Sink": sink, "TargetFlow": target_flow, "WithWrap": with_wrap}
+        )
 
-    expected = int(value)
-    terminal_sum = sum(int(edge.amount) for edge in flow_edges if edge.stream_sink_id == 1)
+    with metrics.PATHFINDER_SECONDS.time():
+        found = pathfinder.find_paths(params)
 
-    if terminal_sum != expected:
-        click.echo(f"Terminal sum {terminal_sum} does not equal expected {expected}")
-        return None
+    for i, result in zip(misses, found):
+        source, sink, target_flow, _ = queries[i]
+        if local and LOCAL_PATHFINDER == "fallback" and not (result and result.get("transfers")):
+            transfers = _find_local_path(source, sink, target_flow)
+            if transfers:
+                _cache_path(cache_keys[i], source, sink, transfers)
+                results[i] = transfers
+                continue
 
-    term_edge_ids = [i for i, edge in enumerate(flow_edges) if edge.stream_sink_id == 1]
+        # Transport and JSON-RPC errors are transient, so only actual answers are cached
+        if result is None:
+            continue
 
-    streams = [Stream(source_coordinate=idx[sender], flow_edge_ids=term_edge_ids, data=b"")]
+        transfers = parse_transfers(result)
+        _cache_path(cache_keys[i], source, sink, transfers)
+        results[i] = transfers
 
-    coords = []
-    for transfer in transfers:
-        coords.append(idx[transfer.token_owner.lower()])
-        coords.append(idx[transfer.from_address.lower()])
-        coords.append(idx[transfer.to_address.lower()])
-
-    packed_coordinates = pack_coordinates(coords)
-
-    return FlowMatrix(
-        flow_vertices=flow_vertices,
-        flow_edges=flow_edges,
-        streams=streams,
-        packed_coordinates=packed_coordinates,
-        source_coordinate=idx[sender],
-    )
+    return results
 
 
-def create_abi_flow_matrix(
-    from_addr: str, to_addr: str, value: str, transfers: List[TransferStep]
-) -> Optional[Tuple[List[str], List[Tuple], List[Tuple], str]]:
-    """Create ABI-ready flow matrix, return None on failure"""
-    flow_matrix = create_flow_matrix(from_addr, to_addr, value, transfers)
+class NoPaymentPath(Exception):
+    """The pathfinder returned no transfers for a redemption."""
 
-    if flow_matrix is None:
-        return None
 
-    flow_edges_tuples = [(edge.stream_sink_id, int(edge.amount)) for edge in flow_matrix.flow_edges]
-    streams_tuples = [(stream.source_coordinate, stream.flow_edge_ids, stream.data) for stream in flow_matrix.streams]
-    packed_coords_hex = "0x" + flow_matrix.packed_coordinates.hex()
+class PathfinderUnavailable(Exception):
+    """The pathfinder couldn't be asked for a redemption's path, so whether one exists is unknown."""
 
-    return (
-        flow_matrix.flow_vertices,
-        flow_edges_tuples,
-        streams_tuples,
-        packed_coords_hex,
+
+class FlowMatrixMismatch(Exception):
+    """The transfers found do not deliver exactly the subscription amount to the recipient."""
+
+
+def _find_paths(subs: List[Subscription]) -> List[Optional[List[TransferStep]]]:
+    """Find the payment path of every subscription in `subs` with one batched pathfinder call."""
+    for sub in subs:
+        click.echo(
+            f"Finding path for sub {sub.sub_id}: {sub.subscriber} -> {sub.recipient} ({sub.amount})"
+        )
+
+    paths = find_circles_paths_and_parse(
+        [(sub.subscriber, sub.recipient, str(sub.amount), True) for sub in subs]
     )
+    for sub, transfers in zip(subs, paths):
+        if transfers is None:
+            continue
+        subscriber = sub.subscriber.lower()
+        balance_tracker.learn(
+            sub.subscriber,
+            [t.token_owner for t in transfers if t.from_address.lower() == subscriber],
+        )
+    return paths
 
 
-def make_jsonrpc_request(url: str, method: str, params: Any, request_id: int = 0) -> Dict[str, Any]:
-    """Make a JSON-RPC 2.0 request, return empty dict on failure"""
-    try:
-        payload = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
-        result = response.json()
+def _build_redemption_args(
+    sub_id: int,
+    subscriber: str,
+    recipient: str,
+    amount: int,
+    transfers: Optional[List[TransferStep]],
+) -> Tuple[List[str], List[Tuple], List[Tuple], str]:
+    """Build the ABI flow matrix for a redemption from the payment path found for it."""
+    amount_str = str(amount)
 
-        if "error" in result:
-            click.echo(f"JSON-RPC error: {result['error']}")
-            return {}
+    if transfers is None:
+        raise PathfinderUnavailable(f"Pathfinder unavailable for sub {sub_id}")
+    if not transfers:
+        raise NoPaymentPath(f"No payment path found for sub {sub_id}")
 
-        return result
-    except Exception as e:
-        click.echo(f"Network request failed: {e}")
-        return {}
+    click.echo(f"Found {len(transfers)} transfer steps for sub {sub_id}")
+
+    with metrics.FLOW_MATRIX_SECONDS.time():
+        result = create_abi_flow_matrix(
+            from_addr=subscriber, to_addr=recipient, value=amount_str, transfers=transfers
+        )
 
+    if result is None:
+        raise FlowMatrixMismatch(f"Flow matrix creation failed for sub {sub_id}")
 
-def find_circles_path_and_parse(
-    source: str,
-    sink: str,
-    target_flow: str,
-    with_wrap: bool = True,
-    pathfinder_url: str = "https://rpc.aboutcircles.com/",
-) -> List[TransferStep]:
-    """Find a payment path and return empty list on failure"""
-    params = [{"Source": source, "Sink": sink, "TargetFlow": target_flow, "WithWrap": with_wrap}]
-
-    pathfinder_response = make_jsonrpc_request(url=pathfinder_url, method="circlesV2_findPath", params=params)
-
-    if not pathfinder_response or "result" not in pathfinder_response:
-        return []
+    return result
 
-    result = pathfinder_response["result"]
-    if "transfers" not in result:
-        return []
 
-    transfers = []
-    for transfer in result["transfers"]:
-        transfers.append(
-            TransferStep(
-                from_address=transfer["from"],
-                to_address=transfer["to"],
-                token_owner=transfer["tokenOwner"],
-                value=transfer["value"],
-            )
+def _send_transaction(txn):
+    """Sign and broadcast `txn` from signer_account with a locally assigned nonce, then await it."""
+    with nonce_manager.reserve() as nonce:
+        txn.nonce = nonce
+        signed_txn = signer_account().sign_transaction(txn)
+        txn_hash = accounts.provider.web3.eth.send_raw_transaction(
+            signed_txn.serialize_transaction()
         )
 
-    return transfers
+    with metrics.CONFIRMATION_SECONDS.time():
+        receipt = accounts.provider.get_receipt(txn_hash.hex())
+    receipt.raise_for_status()
+    return receipt
+
 
+def _flow_matrix_shape(
+    redemption_args: Tuple[List[str], List[Tuple], List[Tuple], str],
+) -> Tuple[int, int, int]:
+    flow_vertices, flow_edges, streams, _ = redemption_args
+    return len(flow_vertices), len(flow_edges), len(streams)
 
-def _redeem(sub_id: int, module: str, subscriber: str, recipient: str, amount: int) -> bool:
-    """Redeem a subscription payment using Circles pathfinder and flow matrix."""
+
+def _redemption_transaction(
+    sub_id: int, module: str, redemption_args: Tuple[List[str], List[Tuple], List[Tuple], str]
+):
+    """Build a redeemPayment transaction, raising RedemptionReverted if it would revert.
+
+    Either way this happens before a nonce is taken, so reverts never leave nonce gaps. By
+    default ape's gas estimate doubles as the simulation. In REDEMPTION_PREFLIGHT mode the call
+    is simulated with eth_call at the latest block and the gas limit comes from gas_cache, so
+    only the first redemption of each flow-matrix shape is estimated.
+    """
+    redeem_payment = subscription_manager.redeemPayment
     try:
-        amount_str = str(amount)
-        click.echo(f"Finding path for sub {sub_id}: {subscriber} -> {recipient} ({amount_str})")
-
-        transfers = find_circles_path_and_parse(
-            source=subscriber,
-            sink=recipient,
-            target_flow=amount_str,
-            with_wrap=True,
-        )
+        if not REDEMPTION_PREFLIGHT:
+            return redeem_payment.as_transaction(
+                module, sub_id, *redemption_args, sender=signer_account()
+            )
 
-        if not transfers:
-            click.echo(f"No payment path found for sub {sub_id}")
-            return False
+        redeem_payment.call(module, sub_id, *redemption_args, sender=signer_account())
 
-        click.echo(f"Found {len(transfers)} transfer steps for sub {sub_id}")
+        shape = _flow_matrix_shape(redemption_args)
+        gas_limit = gas_cache.get(shape)
+        if gas_limit is None:
+            estimate = redeem_payment.estimate_gas_cost(
+                module, sub_id, *redemption_args, sender=signer_account()
+            )
+            gas_limit = gas_cache.record(shape, estimate)
 
-        result = create_abi_flow_matrix(from_addr=subscriber, to_addr=recipient, value=amount_str, transfers=transfers)
+    except ContractLogicError as e:
+        raise RedemptionReverted(classify_revert(e, REVERT_SELECTORS)) from e
 
-        if result is None:
-            click.echo(f"Flow matrix creation failed for sub {sub_id}")
-            return False
+    return redeem_payment.as_transaction(
+        module, sub_id, *redemption_args, sender=signer_account(), gas_limit=gas_limit
+    )
 
-        flow_vertices, flow_edges, streams, packed_coordinates = result
 
-        # DEBUG: Print all transaction parameters
+def _send_redemption_transaction(
+    sub_id: int,
+    module: str,
+    redemption_args: Tuple[List[str], List[Tuple], List[Tuple], str],
+    txn,
+) -> None:
+    try:
+        _send_transaction(txn)
+    except Exception:
+        # The cached gas limit may have been too tight for this path; estimate afresh next time
+        gas_cache.evict(_flow_matrix_shape(redemption_args))
+        raise
+
+    metrics.REDEMPTIONS_SUCCEEDED.inc()
+    click.echo(f"Redemption completed for sub {sub_id} on module {module}")
+
+
+def _send_redemption(
+    sub_id: int, module: str, redemption_args: Tuple[List[str], List[Tuple], List[Tuple], str]
+) -> None:
+    """Send a single redeemPayment transaction, raising if it cannot be sent or reverts."""
+    txn = _redemption_transaction(sub_id, module, redemption_args)
+    _send_redemption_transaction(sub_id, module, redemption_args, txn)
+
+
+def _redeem(
+    sub_id: int,
+    module: str,
+    subscriber: str,
+    recipient: str,
+    amount: int,
+    transfers: Optional[List[TransferStep]],
+) -> None:
+    """Redeem a subscription payment using Circles pathfinder and flow matrix.
+
+    Raises on failure so the caller can record the error class against the subscription.
+    """
+    result = _build_redemption_args(sub_id, subscriber, recipient, amount, transfers)
+    flow_vertices, flow_edges, streams, packed_coordinates = result
+
+    # DEBUG: Print all transaction parameters, only when LOG_LEVEL=DEBUG
+    if LOG_LEVEL == "DEBUG":
         click.echo(f"=== TRANSACTION DEBUG INFO FOR SUB {sub_id} ===")
         click.echo(f"module: {module}")
         click.echo(f"sub_id: {sub_id}")
@@ -474,102 +967,465 @@ def _redeem(sub_id: int, module: str, subscriber: str, recipient: str, amount: i
         click.echo(f"streams ({len(streams)} items): {streams}")
         click.echo(f"packed_coordinates: {packed_coordinates}")
         click.echo(f"packed_coordinates length: {len(packed_coordinates)} chars")
-        click.echo(f"sender: {signer_account.address}")
+        click.echo(f"sender: {signer_account().address}")
         click.echo("=== END DEBUG INFO ===")
 
-        subscription_manager.redeemPayment(
-            module,
-            sub_id,
-            flow_vertices,
-            flow_edges,
-            streams,
-            packed_coordinates,
-            sender=signer_account,
+    _send_redemption(sub_id, module, result)
+
+
+def _record_failure(sub: Subscription, error: Exception) -> None:
+    """Back off or quarantine `sub` after a failed redemption attempt."""
+    click.echo(f"Redemption failed for sub {sub.sub_id}: {error}")
+    if isinstance(error, RedemptionReverted):
+        error_class = error.reason
+    else:
+        error_class = type(error).__name__
+    metrics.REDEMPTIONS_FAILED.labels(error_class).inc()
+    if isinstance(error, (NoPaymentPath, FlowMatrixMismatch)):
+        balance_tracker.mark_underfunded(sub.subscriber)
+    # An unreachable pathfinder says nothing about the subscriber, so it never leads to quarantine
+    failure = scheduler.record_failure(
+        sub.sub_id,
+        sub.module,
+        error_class,
+        int(time.time()),
+        transient=isinstance(error, PathfinderUnavailable),
+    )
+
+    if failure.quarantined:
+        click.echo(
+            f"Sub {sub.sub_id} on {sub.module} quarantined after {failure.count} failures "
+            f"(last error: {failure.last_error})"
         )
+    else:
+        click.echo(f"Sub {sub.sub_id} on {sub.module} will be retried at {failure.next_retry_at}")
 
-        click.echo(f"Redemption completed for sub {sub_id} on module {module}")
-        return True
 
+def _redeem_prepared(
+    sub: Subscription, redemption_args: Tuple[List[str], List[Tuple], List[Tuple], str]
+) -> None:
+    """Worker entry point: send ready-made arguments for `sub`, rebuilding them if they revert."""
+    try:
+        txn = _redemption_transaction(sub.sub_id, sub.module, redemption_args)
     except Exception as e:
-        click.echo(f"Redemption failed for sub {sub_id}: {e}")
-        return False
+        # Already redeemed by someone else (or cancelled): a fresh path would revert just the same
+        if isinstance(e, RedemptionReverted) and e.reason == "NotRedeemable":
+            _record_failure(sub, e)
+            return
+
+        click.echo(f"Prepared payload for sub {sub.sub_id} no longer simulates, rebuilding: {e}")
+        path_cache.invalidate(sub.subscriber)
+        for transfers in _find_paths_or_fail([sub]):
+            _redeem_subscription(sub, transfers)
+        return
+
+    try:
+        _send_redemption_transaction(sub.sub_id, sub.module, redemption_args, txn)
+    except Exception as e:
+        _record_failure(sub, e)
+
+
+def _redeem_subscription(sub: Subscription, transfers: Optional[List[TransferStep]]) -> None:
+    """Worker entry point: redeem `sub` along `transfers`, backing it off if the attempt failed."""
+    # Successful redemptions are requeued by the Redeemed event with their next redeem_at
+    try:
+        _redeem(sub.sub_id, sub.module, sub.subscriber, sub.recipient, sub.amount, transfers)
+    except Exception as e:
+        _record_failure(sub, e)
+
+
+# Batched redemptions through Multicall3
+def _prepare_redemption(
+    sub: Subscription, transfers: Optional[List[TransferStep]]
+) -> Optional[Tuple[List[str], List[Tuple], List[Tuple], str]]:
+    """Worker entry point: build the redeemPayment arguments for `sub`, None on failure."""
+    try:
+        return _build_redemption_args(
+            sub.sub_id, sub.subscriber, sub.recipient, sub.amount, transfers
+        )
+    except Exception as e:
+        _record_failure(sub, e)
+        return None
+
+
+def _redeem_batched(subs: List[Subscription], calls: List[Tuple[Subscription, Tuple]]) -> None:
+    """Worker entry point: find paths and build payloads for `subs`, then send them and `calls`
+    in multicall batches.
+
+    Payloads are built on this worker rather than fanned out to the pool, since waiting on other
+    workers from inside one could deadlock a saturated pool.
+    """
+    calls = list(calls)
+    for sub, transfers in zip(subs, _find_paths_or_fail(subs)):
+        redemption_args = _prepare_redemption(sub, transfers)
+        if redemption_args is not None:
+            calls.append((sub, redemption_args))
+
+    for i in range(0, len(calls), REDEMPTION_MAX_BATCH_SIZE):
+        redemption_executor.submit(_send_redemption_batch, calls[i : i + REDEMPTION_MAX_BATCH_SIZE])
+
+
+def _send_redemption_batch(calls: List[Tuple[Subscription, Tuple]]) -> None:
+    """Worker entry point: redeem `calls` in one multicall transaction, bisecting on failure.
+
+    Every call is sent with allowFailure=False, so gas estimation reverts when any element would
+    revert. Batches that revert or estimate above REDEMPTION_MAX_BATCH_GAS are split in half and
+    retried until the offending calls are isolated and fail on their own. Once a batch has been
+    handed to _send_transaction it may land on chain, so a failure from then on is recorded
+    against every call instead of resending them.
+    """
+    if len(calls) == 1:
+        _redeem_prepared(*calls[0])
+        return
+
+    try:
+        batch = multicall.Transaction()
+        for sub, redemption_args in calls:
+            batch.add(
+                subscription_manager.redeemPayment,
+                sub.module,
+                sub.sub_id,
+                *redemption_args,
+                allowFailure=False,
+            )
+
+        # The cap doubles as the estimation allowance, so oversized batches fail to estimate too
+        txn = batch.as_transaction(sender=signer_account(), gas_limit=REDEMPTION_MAX_BATCH_GAS)
+        gas_estimate = accounts.provider.estimate_gas_cost(txn)
+        if gas_estimate > REDEMPTION_MAX_BATCH_GAS:
+            raise ValueError(f"estimated gas {gas_estimate} exceeds {REDEMPTION_MAX_BATCH_GAS}")
+
+    except Exception as e:
+        click.echo(f"Batch of {len(calls)} redemptions failed, bisecting: {e}")
+        middle = len(calls) // 2
+        _send_redemption_batch(calls[:middle])
+        _send_redemption_batch(calls[middle:])
+        return
+
+    try:
+        _send_transaction(txn)
+    except Exception as e:
+        click.echo(f"Batch of {len(calls)} redemptions failed after sending: {e}")
+        for sub, _ in calls:
+            _record_failure(sub, e)
+        return
+
+    metrics.REDEMPTIONS_SUCCEEDED.inc(len(calls))
+    for sub, _ in calls:
+        click.echo(f"Redemption completed for sub {sub.sub_id} on module {sub.module}")
+
+
+# Look-ahead payload preparation
+def _simulate_flow_matrix(
+    subscriber: str, redemption_args: Tuple[List[str], List[Tuple], List[Tuple], str]
+) -> None:
+    """eth_call Hub.operateFlowMatrix from the subscriber's Safe, raising if it would revert.
+
+    redeemPayment itself reverts with NotRedeemable until redeem_at, so ahead of time only the
+    flow matrix the module will execute on the Safe's behalf can be simulated.
+    """
+    calldata = hub.operateFlowMatrix.encode_input(*redemption_args)
+    accounts.provider.web3.eth.call(
+        {"from": to_checksum_address(subscriber), "to": hub.address, "data": calldata}
+    )
+
+
+def _prepare_payloads(subs: List[Subscription]) -> None:
+    """Worker entry point: find paths for `subs`, then build and simulate their payloads."""
+    settled = set()
+    try:
+        for sub, transfers in zip(subs, _find_paths(subs)):
+            settled.add(sub.key)
+            try:
+                redemption_args = _build_redemption_args(
+                    sub.sub_id, sub.subscriber, sub.recipient, sub.amount, transfers
+                )
+                _simulate_flow_matrix(sub.subscriber, redemption_args)
+            except Exception as e:
+                click.echo(f"Payload preparation failed for sub {sub.sub_id}: {e}")
+                payload_store.release(sub)
+                continue
+
+            flow_vertices = redemption_args[0]
+            payload_store.put(sub, redemption_args, flow_vertices)
+            click.echo(f"Payload ready for sub {sub.sub_id}, due at {sub.redeem_at}")
+    finally:
+        # Claims never expire, so one left behind would block look-ahead for that subscription
+        for sub in subs:
+            if sub.key not in settled:
+                payload_store.release(sub)
+
+
+def _defer_unfunded(subs: List[Subscription], block) -> List[Subscription]:
+    """Defer subscriptions whose subscriber still can't cover `amount`, return the others.
+
+    Only subscribers the pathfinder recently found unable to pay are checked, all with a single
+    balanceOfBatch call. Deferral isn't a failed attempt, so it never leads to quarantine.
+    """
+    marked = [sub for sub in subs if balance_tracker.is_marked(sub.subscriber)]
+    if not marked:
+        return subs
+
+    try:
+        totals = balance_tracker.totals(block.number, [sub.subscriber for sub in marked])
+    except Exception as e:
+        click.echo(f"Balance pre-check failed, sending every subscription to the pathfinder: {e}")
+        return subs
+
+    funded = []
+    for sub in subs:
+        total = totals.get(sub.subscriber.lower())
+        if total is None or total >= sub.amount:
+            funded.append(sub)
+            continue
+
+        click.echo(
+            f"Sub {sub.sub_id} on {sub.module} deferred: subscriber holds {total} of {sub.amount}"
+        )
+        metrics.REDEMPTIONS_DEFERRED.inc()
+        scheduler.defer(sub.sub_id, sub.module, block.timestamp + REDEMPTION_RETRY_BASE_DELAY)
+    return funded
+
+
+def _wants_payload(sub: Subscription) -> bool:
+    """Whether the look-ahead should build a payload for `sub` on this replica now."""
+    # Unfunded subscribers are left to the balance pre-check when they fall due
+    return (
+        shard_lease.owns(sub.key)
+        and payload_store.needs_payload(sub)
+        and not balance_tracker.is_marked(sub.subscriber)
+    )
+
+
+def _dispatch_redemptions(subs: List[Subscription]) -> None:
+    """Hand due subscriptions to the workers, using prepared payloads wherever they are valid."""
+    metrics.REDEMPTIONS_ATTEMPTED.inc(len(subs))
+    calls, unprepared = [], []
+    for sub in subs:
+        redemption_args = payload_store.take(sub)
+        if redemption_args is None:
+            unprepared.append(sub)
+        else:
+            calls.append((sub, redemption_args))
+
+    # Path lookups can take seconds, so they run on the workers too; each submission counts once
+    # per subscription it covers, so the handler never pops more than the workers can take
+    if REDEMPTION_MAX_BATCH_SIZE > 1:
+        redemption_executor.submit(_redeem_batched, unprepared, calls, weight=len(subs))
+        return
+
+    for sub, redemption_args in calls:
+        redemption_executor.submit(_redeem_prepared, sub, redemption_args)
+    if unprepared:
+        redemption_executor.submit(_redeem_unprepared, unprepared, weight=len(unprepared))
+
+
+def _find_paths_or_fail(subs: List[Subscription]) -> List[Optional[List[TransferStep]]]:
+    """_find_paths, backing every subscription in `subs` off if the lookup itself raised."""
+    try:
+        return _find_paths(subs)
+    except Exception as e:
+        for sub in subs:
+            _record_failure(sub, e)
+        return []
+
+
+def _redeem_unprepared(subs: List[Subscription]) -> None:
+    """Worker entry point: find paths for `subs` in one batch, then redeem each on the pool."""
+    for sub, transfers in zip(subs, _find_paths_or_fail(subs)):
+        redemption_executor.submit(_redeem_subscription, sub, transfers)
 
 
 # Event watching with proper startup handling
 @bot.on_startup()
 def bot_startup(startup_state):
     """Process any events missed while the bot was offline."""
+    # Unlock the signer now, so a bad key fails startup rather than the first redemption
+    click.echo(f"Redeeming from {signer_account().address}")
+
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT, addr=METRICS_ADDR)
+        click.echo(f"Serving Prometheus metrics on {METRICS_ADDR}:{METRICS_PORT}")
+
+    # Listen before loading anything, so no change made by another replica falls in between
+    if CHANGE_FEED and not change_feed.start():
+        click.echo("[ChangeFeed] Not listening yet, will resync once connected")
+
+    if LOCAL_PATHFINDER != "off":
+        if TRUST_GRAPH_PATH and trust_graph.load(TRUST_GRAPH_PATH):
+            click.echo(
+                f"[TrustGraph] Loaded {len(trust_graph)} balances from {TRUST_GRAPH_PATH} "
+                f"at block {trust_graph.block_number}"
+            )
+        # Syncs in the background; paths are searched locally once it has caught up
+        trust_graph_sync.submit(_sync_trust_graph, chain.blocks.head.number)
+
     last_processed_block = _load_block_db()
-    current_block = chain.blocks.head.number
+    head = chain.blocks.head
+    current_block = head.number
+    final_block = max(indexer.finalized_block(current_block), last_processed_block)
 
     click.echo(f"Starting from block {last_processed_block}, current block {current_block}")
 
-    if current_block > last_processed_block:
-        click.echo(f"Catching up subscriptions from block {last_processed_block + 1} to {current_block}")
-        _process_historical_subscription_creations(start_block=last_processed_block + 1, stop_block=current_block)
+    # A snapshot seeds the scheduler instead of the full table; everything after its block is
+    # replayed on top of it below
+    replay_from = last_processed_block
+    snapshot = snapshot_file.read() if snapshot_file.enabled else None
+    if snapshot is not None:
+        if snapshot.block_number > last_processed_block:
+            click.echo(
+                f"[Snapshot] Snapshot block {snapshot.block_number} is ahead of sync_status "
+                f"({last_processed_block}); replaying from sync_status"
+            )
+        replay_from = min(snapshot.block_number, last_processed_block)
+        for sub in snapshot.subscriptions:
+            scheduler.schedule(sub)
+        click.echo(
+            f"[Snapshot] Seeded scheduler with {len(snapshot.subscriptions)} subscriptions "
+            f"from block {snapshot.block_number}"
+        )
 
-    _save_block_db(current_block)
+    # Blocks recorded before the last shutdown may have been reorged since
+    ancestor = indexer.recover(current_block, last_processed_block)
+    if ancestor is not None:
+        click.echo(f"[Indexer] Recorded events diverge from the chain above block {ancestor}")
+        _restore_scheduler(indexer.rollback(ancestor))
+
+    # Final blocks take the bulk backfill path; only the unconfirmed tail is recorded
+    if final_block > replay_from:
+        click.echo(f"Catching up subscriptions from block {replay_from + 1} to {final_block}")
+        _process_historical_subscription_creations(
+            start_block=replay_from + 1, stop_block=final_block
+        )
+
+    _advance_sync_cursor(current_block, force=True)
+    if current_block > final_block:
+        logs, _ = _get_historical_subscription_logs(final_block + 1, current_block)
+        # The backfill rewrote rows the last run's unconfirmed events were applied on top of
+        _index_logs(logs, after=final_block)
+    indexer.observe_block(current_block, head.hash, head.parent_hash)
+
+    if snapshot is None:
+        _seed_scheduler()
+    else:
+        # Unconfirmed events from the last run may postdate the snapshot
+        _restore_scheduler(indexer.recorded_rows())
+    shard_lease.heartbeat(force=True)
 
 
 @bot.on_(subscription_manager.SubscriptionCreated)
 def handle_subscription_creation(log):
-    subscriptions_df = _load_subscriptions_db()
-    new_subscription = {
-        "block_number": log.block_number,
-        "sub_id": log.subId,
-        "module": log.module,
-        "subscriber": log.subscriber,
-        "recipient": log.recipient,
-        "amount": log.amount,
-        "frequency": log.frequency,
-        "redeem_at": 0,
-    }
-
-    subscription_df = pd.concat([subscriptions_df, pd.DataFrame([new_subscription])], ignore_index=True)
-    _save_subscriptions_db(subscription_df)
-    click.echo(f"Sub {log.subId} created on {log.module}")
+    _index_logs([log])
 
 
 @bot.on_(subscription_manager.Redeemed)
 def handle_redemption(log):
-    subscriptions_df = _load_subscriptions_db()
-    mask = (subscriptions_df["sub_id"] == log.subId) & (subscriptions_df["module"] == log.module)
-    subscriptions_df.loc[mask, "redeem_at"] = log.nextRedeemAt
-    _save_subscriptions_db(subscriptions_df)
-    click.echo(f"Redemption completed {log.subId} on module {log.module}, next redeem: {log.nextRedeemAt}")
+    _index_logs([log])
+
+
+@bot.on_(hub.Trust)
+def handle_trust(log):
+    path_cache.invalidate(log.truster, log.trustee)
+    payload_store.invalidate(log.truster, log.trustee)
+
+
+@bot.on_(hub.TransferSingle)
+def handle_transfer_single(log):
+    path_cache.invalidate(log.event_arguments["from"], log.event_arguments["to"])
+    payload_store.invalidate(log.event_arguments["from"], log.event_arguments["to"])
+    balance_tracker.invalidate(log.event_arguments["to"])
+
+
+@bot.on_(hub.TransferBatch)
+def handle_transfer_batch(log):
+    path_cache.invalidate(log.event_arguments["from"], log.event_arguments["to"])
+    payload_store.invalidate(log.event_arguments["from"], log.event_arguments["to"])
+    balance_tracker.invalidate(log.event_arguments["to"])
 
 
 @bot.on_(chain.blocks)
 def handle_subscriptions(block):
     bot.state.last_processed_block = block.number
-    subscriptions_df = _load_subscriptions_db()
 
-    if subscriptions_df.empty:
-        return
-
-    sub_module_pairs = _get_sub_module_pairs_from_df(subscriptions_df)
-
-    for sub_id, module in sub_module_pairs:
-        sub_row = subscriptions_df[
-            (subscriptions_df["sub_id"] == sub_id) & (subscriptions_df["module"] == module)
-        ].iloc[0]
+    ancestor = indexer.observe_block(block.number, block.hash, block.parent_hash)
+    if ancestor is not None:
+        _roll_back_to(ancestor, block.number)
+    synced_block = _advance_sync_cursor(block.number)
+    if synced_block is not None and snapshot_file.enabled and snapshot_file.due():
+        _write_snapshot(synced_block)
+    if LOCAL_PATHFINDER != "off" and not _trust_graph_lock.locked():
+        trust_graph_sync.submit(_sync_trust_graph, block.number)
+
+    metrics.record_head_block(block.number)
+    metrics.QUEUE_DEPTH.set(len(scheduler))
+    metrics.PENDING_REDEMPTIONS.set(redemption_executor.pending)
+
+    # Connection pool wait times and quarantine size are reported as Silverback metrics
+    datapoints = db_pool.wait_stats()
+    datapoints["quarantined_subscriptions"] = len(scheduler.quarantined())
+
+    # Only pop what the executor can take so overflow stays ordered in the scheduler
+    capacity = redemption_executor.capacity
+    if capacity == 0:
+        return datapoints
+
+    shard_lease.heartbeat()
+    due_subscriptions = []
+    for sub in scheduler.pop_due(block.timestamp, limit=capacity):
+        if shard_lease.owns(sub.key):
+            due_subscriptions.append(sub)
+        else:
+            # Another replica owns it; look again once shards may have changed hands
+            scheduler.defer(sub.sub_id, sub.module, block.timestamp + REDEMPTION_SHARD_HEARTBEAT)
 
-        if sub_row["redeem_at"] == 0:
-            click.echo(f"Sub {sub_id} on {module} ready for first redemption")
-            _redeem(sub_id, module, sub_row["subscriber"], sub_row["recipient"], sub_row["amount"])
-        elif sub_row["redeem_at"] <= block.timestamp:
-            click.echo(f"Sub {sub_id} on {module} is due for redemption!")
-            _redeem(sub_id, module, sub_row["subscriber"], sub_row["recipient"], sub_row["amount"])
+    for sub in due_subscriptions:
+        if sub.redeem_at == 0:
+            click.echo(f"Sub {sub.sub_id} on {sub.module} ready for first redemption")
         else:
-            time_until_next = sub_row["redeem_at"] - block.timestamp
-            click.echo(f"Sub {sub_id} on {module} not due yet. Time remaining: {time_until_next} seconds")
+            click.echo(f"Sub {sub.sub_id} on {sub.module} is due for redemption!")
+
+    if due_subscriptions:
+        due_subscriptions = _defer_unfunded(due_subscriptions, block)
+    if due_subscriptions:
+        _dispatch_redemptions(due_subscriptions)
+
+    # Spare capacity goes to building payloads for subscriptions that fall due soon
+    if REDEMPTION_LOOKAHEAD > 0 and redemption_executor.capacity > 0:
+        upcoming = payload_store.claim(
+            scheduler.peek_due(
+                block.timestamp + REDEMPTION_LOOKAHEAD,
+                limit=REDEMPTION_LOOKAHEAD_LIMIT,
+                where=_wants_payload,
+            )
+        )
+        if upcoming:
+            redemption_executor.submit(_prepare_payloads, upcoming)
+
+    datapoints["prepared_payloads"] = len(payload_store)
+    if shard_lease.enabled:
+        datapoints["owned_shards"] = len(shard_lease.owned)
+        datapoints["shard_members"] = shard_lease.members
+    return datapoints
 
 
 @bot.on_shutdown()
 def shutdown_bot():
     click.echo("[Bot] Shutdown triggered.")
+    redemption_executor.shutdown(wait=True)
     block = getattr(bot.state, "last_processed_block", None)
     if block is not None:
-        success = _save_block_db(block)
-        if success:
-            click.echo(f"[DB] Saved final block {block} to DB.")
+        # Unconfirmed blocks stay recorded in subscription_events and are re-checked on startup
+        final_block = _advance_sync_cursor(block, force=True)
+        if final_block is not None:
+            click.echo(f"[DB] Saved final block {final_block} to DB.")
+        if snapshot_file.enabled:
+            _write_snapshot(indexer.synced_block)
+
+    trust_graph_sync.shutdown(wait=True, cancel_futures=True)
+    if LOCAL_PATHFINDER != "off" and TRUST_GRAPH_PATH:
+        _save_trust_graph()
+
+    pathfinder.close()
+    shard_lease.close()
+    change_feed.close()
+    db_pool.close()
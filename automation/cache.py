@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class PathCache:
+    """LRU cache of pathfinder results with a TTL, including negative ("no path") results.
+
+    Each entry is indexed by every address its lookup touched (source, sink and the parties of
+    each transfer step), so a trust change or transfer involving any of them evicts the entry
+    before its TTL runs out. `get` returns None on a miss and an empty list for a cached miss.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 120.0, negative_ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, List, Set[str]]]" = OrderedDict()
+        self._by_address: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[List]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._evict(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: List, addresses: Iterable[str]) -> None:
+        ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0:
+            return
+
+        addresses = {address.lower() for address in addresses}
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+
+            self._entries[key] = (time.monotonic() + ttl, value, addresses)
+            for address in addresses:
+                self._by_address.setdefault(address, set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                self._evict(next(iter(self._entries)))
+
+    def invalidate(self, *addresses: str) -> int:
+        """Evict every entry that involves any of `addresses`, returning how many were dropped."""
+        with self._lock:
+            keys = set()
+            for address in addresses:
+                keys |= self._by_address.get(address.lower(), set())
+
+            for key in keys:
+                self._evict(key)
+
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_address.clear()
+
+    def _evict(self, key: Hashable) -> None:
+        _, _, addresses = self._entries.pop(key)
+        for address in addresses:
+            keys = self._by_address.get(address)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_address[address]
@@ -0,0 +1,109 @@
+import json
+import select
+import threading
+from typing import Callable, Dict, Optional
+
+import click
+import psycopg2
+
+from table import SUBSCRIPTION_CHANGES_CHANNEL
+
+
+class ChangeFeed:
+    """Follows the row-level changes to `subscriptions` that the schema's trigger publishes.
+
+    A background thread LISTENs on a dedicated autocommit connection and passes each change to
+    `on_change`, in commit order. Changes whose origin is `origin`, this process's own
+    application_name, are skipped since the process has applied them already. Notifications sent
+    while the connection was down are lost, so after every reconnect `on_resync` runs before any
+    new change is delivered.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str],
+        origin: str,
+        on_change: Callable[[Dict], None],
+        on_resync: Callable[[], None],
+        poll_interval: float = 5.0,
+        retry_delay: float = 5.0,
+    ):
+        self.dsn = dsn
+        self.origin = origin
+        self.on_change = on_change
+        self.on_resync = on_resync
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._listening = threading.Event()
+        self._gave_up = False
+        self._lock = threading.Lock()
+
+    def start(self, timeout: float = 10.0) -> bool:
+        """Start following changes; True once listening, False if not yet after `timeout`."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            self._thread.start()
+        if self._listening.wait(timeout):
+            return True
+        with self._lock:
+            # Connecting later than this means the caller loaded state it didn't hear about
+            self._gave_up = not self._listening.is_set()
+            return not self._gave_up
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        connected_before = False
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {SUBSCRIPTION_CHANGES_CHANNEL}")
+                with self._lock:
+                    resync = connected_before or self._gave_up
+                    self._listening.set()
+                connected_before = True
+                if resync:
+                    click.echo("[ChangeFeed] Listening again, resyncing missed changes")
+                    self.on_resync()
+
+                while not self._stopped.is_set():
+                    if not select.select([conn], [], [], self.poll_interval)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError) as e:
+                click.echo(f"[ChangeFeed] Connection lost, retrying in {self.retry_delay}s: {e}")
+                self._stopped.wait(self.retry_delay)
+            except Exception as e:
+                # A failed resync leaves changes unapplied; reconnect so it is tried again
+                click.echo(f"[ChangeFeed] Resync failed, retrying in {self.retry_delay}s: {e}")
+                self._stopped.wait(self.retry_delay)
+            finally:
+                self._listening.clear()
+                if conn is not None:
+                    conn.close()
+
+    def _deliver(self, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            click.echo(f"[ChangeFeed] Ignoring malformed notification: {payload[:200]}")
+            return
+        if change.get("origin") == self.origin:
+            return
+
+        try:
+            self.on_change(change)
+        except Exception as e:
+            click.echo(f"[ChangeFeed] Failed to apply {change}: {e}")
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+class NonceManager:
+    """Hands out consecutive nonces for a single sender without a node round-trip per transaction.
+
+    The counter is synced lazily from `fetch_nonce`, which should return the sender's pending
+    transaction count. A reserved nonce is held under a lock while the caller signs and broadcasts,
+    so nodes always receive nonces in order while receipts are awaited concurrently.
+    """
+
+    def __init__(self, fetch_nonce: Callable[[], int]):
+        self._fetch_nonce = fetch_nonce
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reserve(self) -> Iterator[int]:
+        """Yield the next nonce, consuming it only if the body completes without raising."""
+        with self._lock:
+            if self._next is None:
+                self._next = self._fetch_nonce()
+
+            try:
+                yield self._next
+            except Exception:
+                # The broadcast may or may not have reached the node; resync on next use
+                self._next = None
+                raise
+
+            self._next += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._next = None
+
+
+class RedemptionExecutor:
+    """Bounded worker pool that runs redemption attempts off the block handler."""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="redeem")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted attempts that have not finished yet."""
+        return self._pending
+
+    @property
+    def capacity(self) -> int:
+        """How many more attempts can be submitted before hitting `max_pending`."""
+        return max(self.max_pending - self._pending, 0)
+
+    def submit(self, fn: Callable, *args, weight: int = 1) -> Future:
+        """Run `fn(*args)` on the pool, counting it as `weight` pending attempts until it ends."""
+        with self._lock:
+            self._pending += weight
+
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(lambda _future: self._release(weight))
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work, dropping attempts that have not started yet."""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _release(self, weight: int) -> None:
+        with self._lock:
+            self._pending -= weight
@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import click
+import numpy as np
+
+
+@dataclass
+class TransferStep:
+    """Represents a single transfer step in a payment flow."""
+
+    from_address: str
+    to_address: str
+    token_owner: str
+    value: str
+
+
+@dataclass
+class FlowEdge:
+    """Represents an edge in the flow graph."""
+
+    stream_sink_id: int
+    amount: str
+
+
+@dataclass
+class Stream:
+    """Represents a stream in the flow matrix."""
+
+    source_coordinate: int
+    flow_edge_ids: List[int]
+    data: bytes
+
+
+@dataclass
+class FlowMatrix:
+    """Complete flow matrix for ABI encoding."""
+
+    flow_vertices: List[str]
+    flow_edges: List[FlowEdge]
+    streams: List[Stream]
+    packed_coordinates: bytes
+    source_coordinate: int
+
+
+def pack_coordinates(coords: List[int]) -> bytes:
+    """Pack a uint16 array into bytes (big-endian, no padding)."""
+    result = bytearray(len(coords) * 2)
+
+    for i, coord in enumerate(coords):
+        hi = (coord >> 8) & 0xFF
+        lo = coord & 0xFF
+        offset = 2 * i
+        result[offset] = hi
+        result[offset + 1] = lo
+
+    return bytes(result)
+
+
+def transform_to_flow_vertices(
+    transfers: List[TransferStep], from_addr: str, to_addr: str
+) -> Tuple[List[str], Dict[str, int]]:
+    """Build a sorted vertex list plus index lookup for quick coordinate mapping."""
+    addresses = {from_addr.lower(), to_addr.lower()}
+
+    for transfer in transfers:
+        addresses.add(transfer.from_address.lower())
+        addresses.add(transfer.to_address.lower())
+        addresses.add(transfer.token_owner.lower())
+
+    sorted_addresses = sorted(addresses, key=lambda addr: int(addr, 16))
+    idx = {addr: i for i, addr in enumerate(sorted_addresses)}
+
+    return sorted_addresses, idx
+
+
+def create_flow_matrix(
+    from_addr: str, to_addr: str, value: str, transfers: List[TransferStep]
+) -> Optional[FlowMatrix]:
+    """Create flow matrix, return None on validation failure"""
+    sender = from_addr.lower()
+    receiver = to_addr.lower()
+
+    flow_vertices, idx = transform_to_flow_vertices(transfers, sender, receiver)
+
+    flow_edges = []
+    for transfer in transfers:
+        is_terminal = transfer.to_address.lower() == receiver
+        flow_edges.append(FlowEdge(stream_sink_id=1 if is_terminal else 0, amount=transfer.value))
+
+    has_terminal_edge = any(edge.stream_sink_id == 1 for edge in flow_edges)
+    if not has_terminal_edge:
+        to_addresses = [t.to_address.lower() for t in transfers]
+        try:
+            last_edge_index = len(to_addresses) - 1 - to_addresses[::-1].index(receiver)
+        except ValueError:
+            last_edge_index = -1
+
+        fallback_index = last_edge_index if last_edge_index != -1 else len(flow_edges) - 1
+        flow_edges[fallback_index].stream_sink_id = 1
+
+    expected = int(value)
+    terminal_sum = sum(int(edge.amount) for edge in flow_edges if edge.stream_sink_id == 1)
+
+    if terminal_sum != expected:
+        click.echo(f"Terminal sum {terminal_sum} does not equal expected {expected}")
+        return None
+
+    term_edge_ids = [i for i, edge in enumerate(flow_edges) if edge.stream_sink_id == 1]
+
+    streams = [Stream(source_coordinate=idx[sender], flow_edge_ids=term_edge_ids, data=b"")]
+
+    coords = []
+    for transfer in transfers:
+        coords.append(idx[transfer.token_owner.lower()])
+        coords.append(idx[transfer.from_address.lower()])
+        coords.append(idx[transfer.to_address.lower()])
+
+    packed_coordinates = pack_coordinates(coords)
+
+    return FlowMatrix(
+        flow_vertices=flow_vertices,
+        flow_edges=flow_edges,
+        streams=streams,
+        packed_coordinates=packed_coordinates,
+        source_coordinate=idx[sender],
+    )
+
+
+def encode_flow_matrix(
+    from_addr: str, to_addr: str, value: str, transfers: Sequence
+) -> Optional[Tuple[List[str], List[Tuple], List[Tuple], str]]:
+    """Array-backed equivalent of `create_abi_flow_matrix`, return None on validation failure.
+
+    Every address is lower-cased once and laid out as [sender, receiver, (token_owner, from, to)
+    per transfer]. For 0x-prefixed 40-digit hex, lexicographic order of the lower-cased strings
+    is numeric order, so `np.unique` yields the sorted vertex list and its inverse yields every
+    coordinate in packing order, which is then written as a single big-endian uint16 buffer.
+    """
+    addresses = [from_addr, to_addr]
+    for transfer in transfers:
+        addresses.extend((transfer.token_owner, transfer.from_address, transfer.to_address))
+
+    # Fixed-width bytes sort far faster than numpy unicode strings
+    addresses = np.array([address.lower().encode() for address in addresses], dtype="S42")
+    flow_vertices, inverse = np.unique(addresses, return_inverse=True)
+    source_coordinate, receiver_coordinate = int(inverse[0]), int(inverse[1])
+    coords = inverse[2:]
+
+    is_terminal = coords[2::3] == receiver_coordinate
+    if not is_terminal.any():
+        is_terminal[-1] = True
+
+    amounts = [int(transfer.value) for transfer in transfers]
+    term_edge_ids = np.flatnonzero(is_terminal).tolist()
+
+    expected = int(value)
+    terminal_sum = sum(amounts[i] for i in term_edge_ids)
+    if terminal_sum != expected:
+        click.echo(f"Terminal sum {terminal_sum} does not equal expected {expected}")
+        return None
+
+    flow_edges = list(zip(is_terminal.astype(int).tolist(), amounts))
+    streams = [(source_coordinate, term_edge_ids, b"")]
+    packed_coordinates = "0x" + coords.astype(">u2").tobytes().hex()
+
+    return (
+        [vertex.decode() for vertex in flow_vertices.tolist()],
+        flow_edges,
+        streams,
+        packed_coordinates,
+    )
+
+
+def create_abi_flow_matrix(
+    from_addr: str, to_addr: str, value: str, transfers: List[TransferStep]
+) -> Optional[Tuple[List[str], List[Tuple], List[Tuple], str]]:
+    """Create ABI-ready flow matrix, return None on failure"""
+    # Same output as building a FlowMatrix via create_flow_matrix, without per-transfer Python work
+    return encode_flow_matrix(from_addr, to_addr, value, transfers)
@@ -0,0 +1,441 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import click
+
+from pool import ConnectionPool
+from scheduler import SubKey
+
+
+def _hex(value) -> str:
+    """Block hashes come back as HexBytes or str depending on the provider; compare as hex str."""
+    if isinstance(value, str):
+        return value.lower()
+    return "0x" + bytes(value).hex()
+
+
+class EventIndexer:
+    """Applies SubscriptionCreated and Redeemed logs from blocks that are not yet final.
+
+    Every applied log is recorded in `subscription_events` with its block hash and log index, in
+    the same transaction as its effect on `subscriptions`, so a log delivered twice is applied
+    once. Redeemed records keep the `redeem_at` they overwrote so they can be undone. Replicas
+    share these tables, so each process also remembers the unconfirmed logs it has handed to its
+    own scheduler: a log another replica recorded first is still returned once by `apply`.
+
+    Hashes of observed blocks are kept in memory for the last `confirmations` blocks. A block
+    whose parent hash doesn't match the one recorded for its predecessor is a reorg: `rollback`
+    undoes every event above the last block both chains share, newest first, after which the
+    caller re-fetches that short range.
+
+    Events deeper than `confirmations` blocks are final. `finalize` commits the `sync_status`
+    cursor to the last final block every `commit_blocks` blocks or `commit_interval` seconds,
+    pruning the records that became final in the same transaction, so the table only ever holds
+    the unconfirmed tail and a restart never resumes further back than one commit interval.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        block_hash: Callable[[int], object],
+        confirmations: int = 20,
+        commit_blocks: int = 100,
+        commit_interval: float = 60.0,
+    ):
+        self.pool = pool
+        self.block_hash = block_hash
+        self.confirmations = confirmations
+        self.commit_blocks = commit_blocks
+        self.commit_interval = commit_interval
+
+        self._hashes: Dict[int, str] = {}
+        self._event_blocks: Dict[int, str] = {}
+        self._seen: Dict[Tuple[int, int], str] = {}
+        self._finalized = 0
+        self._committed = 0
+        self._committed_at = time.monotonic()
+        self._lock = threading.RLock()
+
+    @property
+    def synced_block(self) -> int:
+        """Block `sync_status` was last committed at."""
+        return self._committed
+
+    def finalized_block(self, head: int) -> int:
+        return max(head - self.confirmations, 0)
+
+    def recover(self, head: int, synced_block: int) -> Optional[int]:
+        """Resume from the `synced_block` cursor and check the recorded events against the chain.
+
+        Meant for startup, when blocks may have been reorged while the bot was down. Only blocks
+        that carry recorded events are checked, one RPC call each. Returns the reorg ancestor if
+        any.
+        """
+        with self._lock:
+            self._finalized = self._committed = synced_block
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT DISTINCT block_number, block_hash FROM subscription_events")
+                self._event_blocks = {int(number): _hex(h) for number, h in cur.fetchall()}
+
+            for number in sorted(self._event_blocks):
+                if number > head or _hex(self.block_hash(number)) != self._event_blocks[number]:
+                    return number - 1
+            return None
+
+    def observe_block(self, number: int, block_hash, parent_hash) -> Optional[int]:
+        """Record a new head, return the last common ancestor if it reveals a reorg."""
+        block_hash, parent_hash = _hex(block_hash), _hex(parent_hash)
+
+        with self._lock:
+            ancestor = None
+            known = [n for n in self._hashes if n < number]
+            if known:
+                previous = max(known)
+                # Missed blocks in between: ask the chain about the last block we did see
+                expected = parent_hash if previous == number - 1 else self._chain_hash(previous)
+                if self._hashes[previous] != expected:
+                    ancestor = self._find_ancestor(previous - 1)
+
+            stale = self._event_blocks.get(number)
+            if ancestor is None and stale is not None and stale != block_hash:
+                ancestor = number - 1
+
+            if ancestor is not None:
+                for n in [n for n in self._hashes if n > ancestor]:
+                    del self._hashes[n]
+                # Learn the replacement blocks too, so late logs from the old branch are dropped
+                for n in range(ancestor + 1, number):
+                    self._hashes[n] = self._chain_hash(n)
+            self._hashes[number] = block_hash
+
+            return ancestor
+
+    def apply(self, logs: List) -> List:
+        """Apply logs not yet recorded and not from a block known to be orphaned.
+
+        A log from a block that is already final, e.g. a late redelivery, is written straight to
+        `subscriptions` without a record, as long as it is from the canonical block and neither
+        recorded nor superseded. Returns the logs this process hadn't returned before, in (block,
+        log index) order: the ones applied now and the ones another replica already recorded.
+        """
+        applied = []
+        with self._lock, self.pool.connection() as conn:
+            for log in sorted(logs, key=lambda log: (log.block_number, log.log_index)):
+                block_hash = _hex(log.block_hash)
+                key = (int(log.block_number), int(log.log_index))
+                if self._seen.get(key) == block_hash:
+                    continue
+                final = log.block_number <= self._finalized
+                canonical = (
+                    self._chain_hash(log.block_number)
+                    if final
+                    else self._hashes.get(log.block_number)
+                )
+                if canonical is not None and canonical != block_hash:
+                    click.echo(f"[Indexer] Skipping log from orphaned block {log.block_number}")
+                    continue
+
+                with conn.cursor() as cur:
+                    if final:
+                        changed = self._apply_final(cur, log)
+                    else:
+                        changed = self._apply_event(cur, log, block_hash)
+                    # Recorded by another replica, whose scheduler is not this one
+                    if not changed:
+                        changed = self._recorded_hash(cur, log) == block_hash
+                conn.commit()
+
+                if changed:
+                    if not final:
+                        self._event_blocks[log.block_number] = block_hash
+                    self._seen[key] = block_hash
+                    applied.append(log)
+
+        return applied
+
+    def reindex(self, after: int, logs: List) -> List:
+        """Replace the events recorded above `after` with `logs`, applying every one again.
+
+        Meant for startup, once the backfill up to `after` has rewritten rows that the last run's
+        unconfirmed events were applied on top of: skipping those events as already recorded would
+        leave the rewritten `redeem_at` in place. The old records are dropped in the same
+        transaction. Returns `logs` in (block, log index) order.
+        """
+        logs = sorted(logs, key=lambda log: (log.block_number, log.log_index))
+        with self._lock, self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM subscription_events WHERE block_number > %s", (after,))
+                for log in logs:
+                    self._apply_event(cur, log, _hex(log.block_hash))
+            conn.commit()
+
+            for n in [n for n in self._event_blocks if n > after]:
+                del self._event_blocks[n]
+            self._forget_seen(lambda n: n > after)
+            for log in logs:
+                self._event_blocks[log.block_number] = _hex(log.block_hash)
+                self._seen[(int(log.block_number), int(log.log_index))] = _hex(log.block_hash)
+
+        return logs
+
+    def rollback(self, ancestor: int) -> Dict[SubKey, Optional[Dict]]:
+        """Undo every recorded event above `ancestor`.
+
+        Returns the restored row of every subscription touched, or None for ones that no longer
+        exist.
+        """
+        touched: Set[SubKey] = set()
+        with self._lock, self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT event_name, sub_id, module, prev_redeem_at FROM subscription_events
+                    WHERE block_number > %s
+                    ORDER BY block_number DESC, log_index DESC
+                    FOR UPDATE
+                    """,
+                    (ancestor,),
+                )
+                for event_name, sub_id, module, prev_redeem_at in cur.fetchall():
+                    touched.add((sub_id, module))
+                    if event_name == "SubscriptionCreated":
+                        cur.execute(
+                            "DELETE FROM subscriptions WHERE sub_id = %s AND module = %s",
+                            (sub_id, module),
+                        )
+                    elif prev_redeem_at is not None:
+                        cur.execute(
+                            """
+                            UPDATE subscriptions SET redeem_at = %s
+                            WHERE sub_id = %s AND module = %s
+                            """,
+                            (prev_redeem_at, sub_id, module),
+                        )
+
+                cur.execute("DELETE FROM subscription_events WHERE block_number > %s", (ancestor,))
+                restored = self._load_rows(cur, touched)
+            conn.commit()
+
+            for n in [n for n in self._event_blocks if n > ancestor]:
+                del self._event_blocks[n]
+            self._forget_seen(lambda n: n > ancestor)
+
+        click.echo(
+            f"[Indexer] Rolled back events above block {ancestor}, "
+            f"{len(touched)} subscriptions restored"
+        )
+        return restored
+
+    def recorded_rows(self) -> Dict[SubKey, Optional[Dict]]:
+        """Current row of every subscription with a recorded event, None for deleted ones."""
+        with self._lock, self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT sub_id, module FROM subscription_events")
+            return self._load_rows(cur, set(cur.fetchall()))
+
+    def finalize(self, head: int, force: bool = False) -> Optional[int]:
+        """Treat blocks `confirmations` below `head` as final, committing the cursor when due.
+
+        Returns the block `sync_status` was advanced to, or None if nothing was committed.
+        """
+        with self._lock:
+            self._finalized = max(self.finalized_block(head), self._finalized)
+            for n in [n for n in self._hashes if n <= self._finalized]:
+                del self._hashes[n]
+
+            finalized = self._finalized
+            due = (
+                force
+                or finalized - self._committed >= self.commit_blocks
+                or time.monotonic() - self._committed_at >= self.commit_interval
+            )
+            if finalized <= self._committed or not due:
+                return None
+
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    # Nothing recorded has become final yet; skip the DELETE
+                    if any(n <= finalized for n in self._event_blocks):
+                        cur.execute(
+                            "DELETE FROM subscription_events WHERE block_number <= %s",
+                            (finalized,),
+                        )
+                    # Replicas share the cursor; one that lags behind must never move it back
+                    cur.execute(
+                        """
+                        INSERT INTO sync_status (name, last_synced_block)
+                        VALUES ('main', %s)
+                        ON CONFLICT (name) DO UPDATE SET last_synced_block =
+                            GREATEST(sync_status.last_synced_block, EXCLUDED.last_synced_block)
+                        """,
+                        (finalized,),
+                    )
+                conn.commit()
+
+            self._committed = finalized
+            self._committed_at = time.monotonic()
+            for n in [n for n in self._event_blocks if n <= finalized]:
+                del self._event_blocks[n]
+            self._forget_seen(lambda n: n <= finalized)
+
+        return finalized
+
+    def _apply_event(self, cur, log, block_hash: str) -> bool:
+        if log.event_name == "SubscriptionCreated":
+            return self._apply_creation(cur, log, block_hash)
+        return self._apply_redemption(cur, log, block_hash)
+
+    def _apply_final(self, cur, log) -> bool:
+        """Apply a log from a final block unless it is recorded or a later event superseded it.
+
+        Records of final blocks are pruned once the cursor passes them, so a creation only
+        inserts a missing row and a redemption only moves `redeem_at` forward.
+        """
+        if self._recorded_hash(cur, log) is not None:
+            return False
+
+        if log.event_name == "SubscriptionCreated":
+            cur.execute(
+                """
+                INSERT INTO subscriptions (
+                    sub_id, module, subscriber, recipient,
+                    amount, frequency, redeem_at, created_block
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, 0, %s)
+                ON CONFLICT (sub_id, module) DO NOTHING
+                """,
+                (
+                    int(log.subId),
+                    str(log.module),
+                    str(log.subscriber),
+                    str(log.recipient),
+                    int(log.amount),
+                    int(log.frequency),
+                    int(log.block_number),
+                ),
+            )
+        else:
+            cur.execute(
+                """
+                UPDATE subscriptions SET redeem_at = %s
+                WHERE sub_id = %s AND module = %s AND redeem_at < %s
+                """,
+                (int(log.nextRedeemAt), int(log.subId), str(log.module), int(log.nextRedeemAt)),
+            )
+
+        if cur.rowcount == 1:
+            click.echo(
+                f"[Indexer] Applied late {log.event_name} log from final block {log.block_number}"
+            )
+            return True
+        return False
+
+    def _apply_creation(self, cur, log, block_hash: str) -> bool:
+        if not self._record(cur, log, block_hash, None):
+            return False
+
+        cur.execute(
+            """
+            INSERT INTO subscriptions (
+                sub_id, module, subscriber, recipient,
+                amount, frequency, redeem_at, created_block
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, 0, %s)
+            ON CONFLICT (sub_id, module) DO UPDATE SET
+                subscriber = EXCLUDED.subscriber,
+                recipient = EXCLUDED.recipient,
+                amount = EXCLUDED.amount,
+                frequency = EXCLUDED.frequency,
+                redeem_at = EXCLUDED.redeem_at,
+                created_block = EXCLUDED.created_block
+            """,
+            (
+                int(log.subId),
+                str(log.module),
+                str(log.subscriber),
+                str(log.recipient),
+                int(log.amount),
+                int(log.frequency),
+                int(log.block_number),
+            ),
+        )
+        return True
+
+    def _apply_redemption(self, cur, log, block_hash: str) -> bool:
+        cur.execute(
+            "SELECT redeem_at FROM subscriptions WHERE sub_id = %s AND module = %s FOR UPDATE",
+            (int(log.subId), str(log.module)),
+        )
+        row = cur.fetchone()
+        if not self._record(cur, log, block_hash, row[0] if row else None):
+            return False
+
+        cur.execute(
+            "UPDATE subscriptions SET redeem_at = %s WHERE sub_id = %s AND module = %s",
+            (int(log.nextRedeemAt), int(log.subId), str(log.module)),
+        )
+        return True
+
+    def _record(self, cur, log, block_hash: str, prev_redeem_at: Optional[int]) -> bool:
+        cur.execute(
+            """
+            INSERT INTO subscription_events (
+                block_number, log_index, block_hash, event_name, sub_id, module, prev_redeem_at
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (block_number, log_index) DO NOTHING
+            """,
+            (
+                int(log.block_number),
+                int(log.log_index),
+                block_hash,
+                log.event_name,
+                int(log.subId),
+                str(log.module),
+                prev_redeem_at,
+            ),
+        )
+        return cur.rowcount == 1
+
+    def _recorded_hash(self, cur, log) -> Optional[str]:
+        cur.execute(
+            "SELECT block_hash FROM subscription_events WHERE block_number = %s AND log_index = %s",
+            (int(log.block_number), int(log.log_index)),
+        )
+        row = cur.fetchone()
+        return _hex(row[0]) if row else None
+
+    def _forget_seen(self, block_filter: Callable[[int], bool]) -> None:
+        for key in [key for key in self._seen if block_filter(key[0])]:
+            del self._seen[key]
+
+    def _load_rows(self, cur, keys: Set[SubKey]) -> Dict[SubKey, Optional[Dict]]:
+        rows: Dict[SubKey, Optional[Dict]] = {key: None for key in keys}
+        for sub_id, module in keys:
+            cur.execute(
+                """
+                SELECT sub_id, module, subscriber, recipient, amount, frequency, redeem_at
+                FROM subscriptions WHERE sub_id = %s AND module = %s
+                """,
+                (sub_id, module),
+            )
+            row = cur.fetchone()
+            if row is not None:
+                columns = [column.name for column in cur.description]
+                rows[(sub_id, module)] = dict(zip(columns, row))
+        return rows
+
+    def _chain_hash(self, number: int) -> str:
+        return _hex(self.block_hash(number))
+
+    def _find_ancestor(self, below: int) -> int:
+        """Newest block at or below `below` that both chains still share.
+
+        Only blocks with a recorded hash can be checked; if none match, every block that isn't
+        final yet is suspect.
+        """
+        recorded = {**self._event_blocks, **self._hashes}
+        for number in sorted((n for n in recorded if self._finalized < n <= below), reverse=True):
+            if self._chain_hash(number) == recorded[number]:
+                return number
+        return self._finalized
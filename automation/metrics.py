@@ -0,0 +1,57 @@
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Latencies
+DB_SECONDS = Histogram(
+    "subi_db_seconds", "Time spent in a DB helper, including connection checkout", ["operation"]
+)
+PATHFINDER_SECONDS = Histogram(
+    "subi_pathfinder_seconds", "Time for one (possibly batched) pathfinder lookup"
+)
+LOCAL_PATHFINDER_SECONDS = Histogram(
+    "subi_local_pathfinder_seconds", "Time for one max-flow search over the local trust graph"
+)
+FLOW_MATRIX_SECONDS = Histogram(
+    "subi_flow_matrix_seconds",
+    "Time to build the ABI flow matrix for one redemption",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+CONFIRMATION_SECONDS = Histogram(
+    "subi_confirmation_seconds",
+    "Time from broadcasting a transaction to receiving its receipt",
+    buckets=(1, 2.5, 5, 10, 15, 30, 60, 120, 300),
+)
+
+# Redemption outcomes
+REDEMPTIONS_ATTEMPTED = Counter("subi_redemptions_attempted", "Redemption attempts started")
+REDEMPTIONS_SUCCEEDED = Counter("subi_redemptions_succeeded", "Redemptions confirmed on chain")
+REDEMPTIONS_DEFERRED = Counter(
+    "subi_redemptions_deferred", "Due redemptions deferred because the subscriber lacks funds"
+)
+REDEMPTIONS_FAILED = Counter(
+    "subi_redemptions_failed", "Failed redemption attempts by error class", ["reason"]
+)
+
+# Queue and sync state
+QUEUE_DEPTH = Gauge("subi_queue_depth", "Subscriptions queued in the redemption scheduler")
+PENDING_REDEMPTIONS = Gauge("subi_pending_redemptions", "Redemption attempts in flight")
+LAST_SYNCED_BLOCK = Gauge("subi_last_synced_block", "Block last saved to sync_status")
+SYNC_LAG = Gauge("subi_sync_lag_blocks", "Head block minus the block last saved to sync_status")
+TRUST_GRAPH_BLOCK = Gauge("subi_trust_graph_block", "Last block applied to the local trust graph")
+REORGS = Counter("subi_reorgs", "Chain reorganisations that rolled back indexed events")
+
+_last_synced_block = 0
+
+
+def record_synced_block(block_number: int) -> None:
+    global _last_synced_block
+    _last_synced_block = block_number
+    LAST_SYNCED_BLOCK.set(block_number)
+
+
+def record_head_block(block_number: int) -> None:
+    SYNC_LAG.set(max(block_number - _last_synced_block, 0))
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1") -> None:
+    """Serve every metric above in the Prometheus text format on http://addr:port/metrics."""
+    start_http_server(port, addr=addr)
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import click
+
+from flowmatrix import TransferStep
+
+
+class PathfinderClient:
+    """JSON-RPC 2.0 client for the Circles pathfinder with pooled keep-alive connections.
+
+    The client owns a private event loop running on a daemon thread, so the aiohttp session (and
+    its open connections) outlives any single call and sync handlers can use it without an event
+    loop of their own. Queries are sent as JSON-RPC batch arrays of up to `max_batch_size`
+    requests, with at most `max_concurrency` HTTP requests in flight. Each HTTP request is bounded
+    by `timeout` and retried `max_retries` times with exponential backoff. If the server answers a
+    batch with a single error object, its requests are sent again one at a time.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        max_concurrency: int = 4,
+        max_batch_size: int = 50,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    def find_paths(self, queries: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Run `circlesV2_findPath` for each query, returning its result or None on failure."""
+        if not queries:
+            return []
+
+        future = asyncio.run_coroutine_threadsafe(self.find_paths_async(queries), self._get_loop())
+        return future.result()
+
+    async def find_paths_async(
+        self, queries: List[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        return await self.batch("circlesV2_findPath", [[query] for query in queries])
+
+    async def batch(self, method: str, params: List[Any]) -> List[Optional[Any]]:
+        """Call `method` once per entry of `params`, split into concurrent JSON-RPC batches."""
+        chunks = [
+            params[i : i + self.max_batch_size] for i in range(0, len(params), self.max_batch_size)
+        ]
+        results = await asyncio.gather(*(self._send_batch(method, chunk) for chunk in chunks))
+        return [result for chunk in results for result in chunk]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._loop is None:
+                return
+
+            asyncio.run_coroutine_threadsafe(self._close_session(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="pathfinder", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Only ever called on the client's loop, so no locking is needed
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _close_session(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _send_batch(self, method: str, params: List[Any]) -> List[Optional[Any]]:
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": request_params}
+            for request_id, request_params in enumerate(params)
+        ]
+
+        response = await self._post(payload)
+        results: List[Optional[Any]] = [None] * len(params)
+        if response is None:
+            return results
+        if not isinstance(response, list):
+            # A single error object answers the whole batch, e.g. when batching is rejected, so the
+            # requests are sent again one at a time
+            click.echo(f"JSON-RPC batch error: {response.get('error', response)}")
+            return await self._send_each(method, params)
+
+        for item in response:
+            request_id = item.get("id")
+            if not isinstance(request_id, int) or not 0 <= request_id < len(params):
+                continue
+            if "error" in item:
+                click.echo(f"JSON-RPC error: {item['error']}")
+            else:
+                results[request_id] = item.get("result")
+
+        return results
+
+    async def _send_each(self, method: str, params: List[Any]) -> List[Optional[Any]]:
+        return list(
+            await asyncio.gather(
+                *(self._send_one(method, request_params) for request_params in params)
+            )
+        )
+
+    async def _send_one(self, method: str, params: Any) -> Optional[Any]:
+        response = await self._post({"jsonrpc": "2.0", "id": 0, "method": method, "params": params})
+        if not isinstance(response, dict):
+            return None
+        if "error" in response:
+            click.echo(f"JSON-RPC error: {response['error']}")
+            return None
+        return response.get("result")
+
+    async def _post(self, payload: Any) -> Optional[Any]:
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    async with session.post(self.url, json=payload) as response:
+                        response.raise_for_status()
+                        return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    click.echo(f"Network request failed: {e!r}")
+                    return None
+                await asyncio.sleep(self.retry_backoff * 2**attempt)
+
+        return None
+
+
+def parse_transfers(result: Dict) -> List[TransferStep]:
+    """Transfer steps of a `circlesV2_findPath` result."""
+    return [
+        TransferStep(
+            from_address=transfer["from"],
+            to_address=transfer["to"],
+            token_owner=transfer["tokenOwner"],
+            value=transfer["value"],
+        )
+        for transfer in result.get("transfers", [])
+    ]
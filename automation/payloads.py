@@ -0,0 +1,102 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from scheduler import SubKey, Subscription
+
+RedemptionArgs = Tuple[List[str], List[Tuple], List[Tuple], str]
+
+
+@dataclass
+class PreparedRedemption:
+    """redeemPayment arguments computed ahead of time for one redemption of a subscription."""
+
+    redeem_at: int
+    amount: int
+    redemption_args: RedemptionArgs
+    addresses: Set[str]
+
+
+class PayloadStore:
+    """Ready-to-send redemption payloads keyed by subscription.
+
+    A payload is only handed out for the exact `redeem_at` and amount it was built for, and is
+    dropped as soon as a trust change or transfer touches any address on its path. Subscriptions
+    are claimed before their payload is built so that look-ahead work is never duplicated.
+    """
+
+    def __init__(self):
+        self._payloads: Dict[SubKey, PreparedRedemption] = {}
+        self._preparing: Set[SubKey] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def claim(
+        self, subs: Iterable[Subscription], limit: Optional[int] = None
+    ) -> List[Subscription]:
+        """Claim up to `limit` subscriptions in `subs` that still need a payload built."""
+        with self._lock:
+            claimed = []
+            for sub in subs:
+                if limit is not None and len(claimed) >= limit:
+                    break
+                if not self._needs_payload(sub):
+                    continue
+                self._preparing.add(sub.key)
+                claimed.append(sub)
+            return claimed
+
+    def needs_payload(self, sub: Subscription) -> bool:
+        """Whether `sub` has neither a payload for its current redemption nor one being built."""
+        with self._lock:
+            return self._needs_payload(sub)
+
+    def put(
+        self, sub: Subscription, redemption_args: RedemptionArgs, addresses: Iterable[str]
+    ) -> None:
+        with self._lock:
+            self._preparing.discard(sub.key)
+            self._payloads[sub.key] = PreparedRedemption(
+                redeem_at=sub.redeem_at,
+                amount=sub.amount,
+                redemption_args=redemption_args,
+                addresses={address.lower() for address in addresses},
+            )
+
+    def release(self, sub: Subscription) -> None:
+        """Give up a claim without storing a payload, e.g. when no path was found."""
+        with self._lock:
+            self._preparing.discard(sub.key)
+
+    def take(self, sub: Subscription) -> Optional[RedemptionArgs]:
+        """Remove and return the payload for `sub` if it was built for its current redemption."""
+        with self._lock:
+            prepared = self._payloads.pop(sub.key, None)
+            if (
+                prepared is None
+                or prepared.redeem_at != sub.redeem_at
+                or prepared.amount != sub.amount
+            ):
+                return None
+            return prepared.redemption_args
+
+    def _needs_payload(self, sub: Subscription) -> bool:
+        prepared = self._payloads.get(sub.key)
+        return sub.key not in self._preparing and (
+            prepared is None or prepared.redeem_at != sub.redeem_at
+        )
+
+    def invalidate(self, *addresses: str) -> int:
+        """Drop every payload whose path involves any of `addresses`, returning how many."""
+        addresses = {address.lower() for address in addresses}
+        with self._lock:
+            stale = [
+                key
+                for key, prepared in self._payloads.items()
+                if not prepared.addresses.isdisjoint(addresses)
+            ]
+            for key in stale:
+                del self._payloads[key]
+            return len(stale)
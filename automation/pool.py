@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import psycopg2
+import psycopg2.pool
+
+
+class ConnectionPool:
+    """Thread-safe Postgres connection pool shared by all DB helpers.
+
+    Callers block (up to `acquire_timeout`) instead of failing when every connection is in use,
+    and the time spent waiting is recorded so the pool size can be tuned. Connections idle for
+    longer than `health_check_interval` are probed with `SELECT 1` on checkout, and any connection
+    that raises a connection-level error is discarded, so the pool recovers from a database
+    restart without restarting the bot. `minconn` connections are opened up front; once opened,
+    up to `maxconn` are kept open for reuse.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str],
+        minconn: int = 1,
+        maxconn: int = 10,
+        health_check_interval: float = 30.0,
+        acquire_timeout: float = 30.0,
+        **connect_kwargs,
+    ):
+        self.dsn = dsn
+        self.connect_kwargs = connect_kwargs
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+
+        self._acquisitions = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @contextmanager
+    def connection(self) -> Iterator["psycopg2.extensions.connection"]:
+        """Check out a healthy connection, returning it to the pool afterwards."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise psycopg2.pool.PoolError("Timed out waiting for a database connection")
+
+        try:
+            conn = self._checkout()
+            self._record_wait(time.monotonic() - started)
+
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._discard(conn)
+                # The server likely went away; make every idle connection prove itself again
+                self._last_used.clear()
+                raise
+            except Exception:
+                self._release(conn)
+                raise
+            else:
+                self._release(conn)
+        finally:
+            self._slots.release()
+
+    def wait_stats(self) -> Dict[str, float]:
+        """Return connection wait metrics accumulated since the previous call, then reset them."""
+        with self._lock:
+            stats = {
+                "db_pool_acquisitions": self._acquisitions,
+                "db_pool_wait_avg_ms": (
+                    1000 * self._wait_total / self._acquisitions if self._acquisitions else 0.0
+                ),
+                "db_pool_wait_max_ms": 1000 * self._wait_max,
+            }
+            self._acquisitions = 0
+            self._wait_total = 0.0
+            self._wait_max = 0.0
+
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+    def _get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, self.dsn, **self.connect_kwargs
+                )
+                # psycopg2 closes returned connections once `minconn` are idle, which under
+                # concurrent workers reconnects on nearly every checkout; keep every one open
+                self._pool.minconn = self.maxconn
+            return self._pool
+
+    def _checkout(self) -> "psycopg2.extensions.connection":
+        pool = self._get_pool()
+        conn = pool.getconn()
+
+        idle_since = self._last_used.get(id(conn), 0.0)
+        if conn.closed or (
+            time.monotonic() - idle_since > self.health_check_interval and not _is_alive(conn)
+        ):
+            self._discard(conn)
+            conn = pool.getconn()
+
+        return conn
+
+    def _release(self, conn) -> None:
+        self._last_used[id(conn)] = time.monotonic()
+        self._get_pool().putconn(conn, close=bool(conn.closed))
+
+    def _discard(self, conn) -> None:
+        self._last_used.pop(id(conn), None)
+        self._get_pool().putconn(conn, close=True)
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self._acquisitions += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
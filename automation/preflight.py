@@ -0,0 +1,68 @@
+import json
+import threading
+from typing import Dict, Optional, Tuple
+
+from eth_utils import function_abi_to_4byte_selector
+
+FlowMatrixShape = Tuple[int, int, int]
+
+
+class RedemptionReverted(Exception):
+    """A pre-flight eth_call of redeemPayment reverted; `reason` is the decoded custom error."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"redeemPayment would revert with {reason}")
+        self.reason = reason
+
+
+class GasCache:
+    """Gas limits for redeemPayment keyed by flow-matrix shape (vertices, edges, streams).
+
+    The gas a redemption needs is dominated by how many vertices, edges and streams its flow
+    matrix has, so the largest estimate seen for a shape, padded by `margin`, is reused for later
+    redemptions of that shape instead of estimating each one.
+    """
+
+    def __init__(self, margin: float = 1.25):
+        self.margin = margin
+        self._estimates: Dict[FlowMatrixShape, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, shape: FlowMatrixShape) -> Optional[int]:
+        with self._lock:
+            estimate = self._estimates.get(shape)
+        return None if estimate is None else int(estimate * self.margin)
+
+    def record(self, shape: FlowMatrixShape, estimate: int) -> int:
+        """Remember `estimate` for `shape` and return the gas limit to use for it."""
+        with self._lock:
+            self._estimates[shape] = max(estimate, self._estimates.get(shape, 0))
+            return int(self._estimates[shape] * self.margin)
+
+    def evict(self, shape: FlowMatrixShape) -> None:
+        with self._lock:
+            self._estimates.pop(shape, None)
+
+
+def load_error_selectors(*abi_paths: str) -> Dict[str, str]:
+    """Map the 4-byte selector ("0x...") of every custom error in `abi_paths` to its name."""
+    selectors = {}
+    for abi_path in abi_paths:
+        with open(abi_path) as f:
+            abi = json.load(f)
+
+        for item in abi:
+            if item.get("type") == "error":
+                selectors["0x" + function_abi_to_4byte_selector(item).hex()] = item["name"]
+
+    return selectors
+
+
+def classify_revert(error: Exception, selectors: Dict[str, str]) -> str:
+    """Name the reason behind a reverted call, decoding custom errors via `selectors`."""
+    # Ape reports custom errors missing from the called contract's ABI as raw revert data
+    message = getattr(error, "revert_message", None) or ""
+    if message.startswith("0x"):
+        return selectors.get(message[:10].lower(), message[:10])
+
+    return message or type(error).__name__
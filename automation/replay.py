@@ -0,0 +1,464 @@
+import contextlib
+import gzip
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import click
+
+# Sets up the mock chain and the scratch schema before the bot is imported
+from bench import BENCH_SCHEMA, CountingConnection, execute, percentile
+from table import SCHEMA_STATEMENTS
+
+# uint256 event arguments, which Parquet captures usually store as strings
+INT_ARGS = ("subId", "amount", "frequency", "nextRedeemAt")
+
+
+# Capture
+def _read_records(path: str) -> List[Dict]:
+    if path.endswith(".parquet"):
+        try:
+            # Imported here so JSONL captures work without pyarrow installed
+            import pyarrow.parquet
+        except ImportError as e:
+            raise click.UsageError("Reading Parquet captures needs pyarrow installed") from e
+        return pyarrow.parquet.read_table(path).to_pylist()
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _log(record: Dict, block_hash: str) -> SimpleNamespace:
+    """Stand-in for an ape ContractLog: event arguments as attributes and in event_arguments."""
+    args = record.get("args") or {}
+    if isinstance(args, str):
+        args = json.loads(args)
+    args = {k: int(v) if k in INT_ARGS else v for k, v in args.items() if v is not None}
+    return SimpleNamespace(
+        event_name=record["event"],
+        block_number=int(record["block_number"]),
+        log_index=int(record["log_index"]),
+        block_hash=record.get("block_hash") or block_hash,
+        event_arguments=args,
+        **args,
+    )
+
+
+class Capture:
+    """Recorded block headers and SubscriptionManager logs, in the order they were observed.
+
+    Each record is a header, {"type": "block", "number", "timestamp", "hash", "parent_hash"}, or
+    a log, {"type": "log", "event", "block_number", "log_index", "block_hash", "args"}, where
+    `event` is SubscriptionCreated or Redeemed and `args` holds its arguments by name. Headers
+    are replayed in file order, so a reorg is recorded as the new branch's headers following the
+    old ones. A log belongs to the header with its block number and hash; without a hash, to the
+    first header with its number.
+    """
+
+    def __init__(self, records: Iterable[Dict]):
+        records = list(records)
+        self.blocks = [
+            SimpleNamespace(
+                number=int(r["number"]),
+                timestamp=int(r["timestamp"]),
+                hash=r["hash"].lower(),
+                parent_hash=r["parent_hash"].lower(),
+            )
+            for r in records
+            if r["type"] == "block"
+        ]
+
+        first_hashes: Dict[int, str] = {}
+        for block in self.blocks:
+            first_hashes.setdefault(block.number, block.hash)
+
+        self.logs: Dict[Tuple[int, str], List[SimpleNamespace]] = {}
+        for record in records:
+            if record["type"] != "log":
+                continue
+            log = _log(record, first_hashes.get(int(record["block_number"]), ""))
+            log.block_hash = log.block_hash.lower()
+            self.logs.setdefault((log.block_number, log.block_hash), []).append(log)
+        for logs in self.logs.values():
+            logs.sort(key=lambda log: log.log_index)
+
+        # Hash of the latest header replayed at each height, i.e. the chain as the bot saw it
+        self._hashes: Dict[int, str] = {}
+
+    @property
+    def log_count(self) -> int:
+        return sum(len(logs) for logs in self.logs.values())
+
+    def observe(self, block) -> List[SimpleNamespace]:
+        """Make `block` canonical at its height and return the logs it carries."""
+        self._hashes[block.number] = block.hash
+        return self.logs.get((block.number, block.hash), [])
+
+    def block_hash(self, number: int) -> str:
+        return self._hashes[number]
+
+    def get_logs(self, start_block: int, stop_block: int) -> Tuple[List, int]:
+        """Canonical logs in [start_block, stop_block], like _get_historical_subscription_logs."""
+        logs = [
+            log
+            for number in range(start_block, stop_block + 1)
+            if number in self._hashes
+            for log in self.logs.get((number, self._hashes[number]), [])
+        ]
+        return logs, stop_block - start_block + 1
+
+    def redemptions(self) -> List[SimpleNamespace]:
+        """Every Redeemed log on the final chain, in block order."""
+        canonical = {block.number: block.hash for block in self.blocks}
+        return sorted(
+            (
+                log
+                for (number, block_hash), logs in self.logs.items()
+                if canonical.get(number) == block_hash
+                for log in logs
+                if log.event_name == "Redeemed"
+            ),
+            key=lambda log: (log.block_number, log.log_index),
+        )
+
+
+# Stubs
+class ReplayPathfinder:
+    """Answers every query with a direct transfer of the full target flow, so all paths pay."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def find_paths(self, queries: List[Dict]) -> List[Optional[Dict]]:
+        self.queries += len(queries)
+        return [
+            {
+                "maxFlow": query["TargetFlow"],
+                "transfers": [
+                    {
+                        "from": query["Source"],
+                        "to": query["Sink"],
+                        "tokenOwner": query["Source"],
+                        "value": query["TargetFlow"],
+                    }
+                ],
+            }
+            for query in queries
+        ]
+
+    def close(self) -> None:
+        pass
+
+
+class InlineExecutor:
+    """RedemptionExecutor that runs work on the calling thread.
+
+    Every attempt submitted for a block has finished before the next block is replayed, so
+    capacity, and with it every scheduling decision, doesn't depend on thread timing.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_pending
+
+    def submit(self, fn: Callable, *args, weight: int = 1) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+class Recorder:
+    """Redemption decisions and submissions made during a replay."""
+
+    def __init__(self):
+        self.block = None
+        self.decisions: List[Dict] = []
+        self.deferred = 0
+        self.failures: Dict[str, int] = {}
+        self.transactions = 0
+        self.redemptions_sent = 0
+        self._lock = threading.Lock()
+
+    def dispatched(self, subs) -> None:
+        for sub in subs:
+            self.decisions.append(
+                {
+                    "block_number": self.block.number,
+                    "timestamp": self.block.timestamp,
+                    "sub_id": sub.sub_id,
+                    "module": sub.module,
+                    "redeem_at": sub.redeem_at,
+                }
+            )
+
+    def failed(self, error_class: str) -> None:
+        with self._lock:
+            self.failures[error_class] = self.failures.get(error_class, 0) + 1
+
+    def sent(self, txn) -> None:
+        with self._lock:
+            self.transactions += 1
+            self.redemptions_sent += txn.redemptions
+
+
+def install_stubs(bot, capture: Capture, recorder: Recorder) -> ReplayPathfinder:
+    """Swap the bot's chain, pathfinder and transaction paths for offline stand-ins."""
+    from indexer import EventIndexer
+    from payloads import PayloadStore
+    from pool import ConnectionPool
+    from scheduler import RedemptionScheduler
+
+    bot.bot.state = SimpleNamespace()
+    bot.db_pool = ConnectionPool(
+        bot.DATABASE_URL, maxconn=bot.DB_POOL_MAX_SIZE, connection_factory=CountingConnection
+    )
+    bot.indexer = EventIndexer(
+        bot.db_pool,
+        block_hash=capture.block_hash,
+        confirmations=bot.CONFIRMATION_DEPTH,
+        commit_blocks=bot.SYNC_COMMIT_BLOCKS,
+        commit_interval=bot.SYNC_COMMIT_INTERVAL,
+    )
+    bot.scheduler = RedemptionScheduler(
+        retry_base_delay=bot.REDEMPTION_RETRY_BASE_DELAY,
+        retry_max_delay=bot.REDEMPTION_RETRY_MAX_DELAY,
+        quarantine_after=bot.REDEMPTION_QUARANTINE_AFTER,
+    )
+    bot.payload_store = PayloadStore()
+    bot.path_cache.clear()
+    bot.redemption_executor = InlineExecutor(max_pending=bot.REDEMPTION_BATCH_LIMIT)
+    bot.pathfinder = pathfinder = ReplayPathfinder()
+
+    # Nothing that needs a live chain: no trust graph, snapshots or balance pre-check reads
+    bot.LOCAL_PATHFINDER = "off"
+    bot.snapshot_file.path = ""
+    bot._get_historical_subscription_logs = capture.get_logs
+    bot.balance_tracker.fetch = _no_chain
+    bot._simulate_flow_matrix = lambda subscriber, redemption_args: None
+
+    # Transactions are counted instead of signed and sent; every one succeeds
+    bot._redemption_transaction = lambda sub_id, module, args: SimpleNamespace(redemptions=1)
+    bot._send_transaction = recorder.sent
+
+    def send_redemption_batch(calls):
+        if len(calls) == 1:
+            bot._redeem_prepared(*calls[0])
+            return
+        recorder.sent(SimpleNamespace(redemptions=len(calls)))
+        bot.metrics.REDEMPTIONS_SUCCEEDED.inc(len(calls))
+
+    bot._send_redemption_batch = send_redemption_batch
+
+    dispatch_redemptions = bot._dispatch_redemptions
+    defer_unfunded = bot._defer_unfunded
+    record_failure = bot._record_failure
+
+    def dispatch(subs):
+        recorder.dispatched(subs)
+        dispatch_redemptions(subs)
+
+    def defer(subs, block):
+        funded = defer_unfunded(subs, block)
+        recorder.deferred += len(subs) - len(funded)
+        return funded
+
+    def fail(sub, error):
+        reason = getattr(error, "reason", None)
+        recorder.failed(reason if isinstance(reason, str) else type(error).__name__)
+        record_failure(sub, error)
+
+    bot._dispatch_redemptions = dispatch
+    bot._defer_unfunded = defer
+    bot._record_failure = fail
+
+    return pathfinder
+
+
+def _no_chain(owners, ids):
+    raise RuntimeError("no chain to read balances from during a replay")
+
+
+# Replay
+def replay(bot, capture: Capture, recorder: Recorder, verbose: bool) -> Dict:
+    """Feed every header and its logs through the bot's handlers, as fast as they return."""
+    latencies = []
+    log_statements = block_statements = 0
+    logs_delivered = 0
+
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        started = time.perf_counter()
+        for block in capture.blocks:
+            recorder.block = block
+
+            statements = CountingConnection.statements
+            for log in capture.observe(block):
+                if log.event_name == "SubscriptionCreated":
+                    bot.handle_subscription_creation(log)
+                else:
+                    bot.handle_redemption(log)
+                logs_delivered += 1
+            log_statements += CountingConnection.statements - statements
+
+            statements = CountingConnection.statements
+            handler_started = time.perf_counter()
+            bot.handle_subscriptions(block)
+            latencies.append(time.perf_counter() - handler_started)
+            block_statements += CountingConnection.statements - statements
+        elapsed = time.perf_counter() - started
+
+    return {
+        "blocks": len(capture.blocks),
+        "logs": logs_delivered,
+        "elapsed_s": elapsed,
+        "blocks_per_s": len(capture.blocks) / elapsed if elapsed else 0.0,
+        "handler_p50_ms": 1000 * statistics.median(latencies) if latencies else 0.0,
+        "handler_p95_ms": 1000 * percentile(latencies, 0.95),
+        "handler_max_ms": 1000 * max(latencies, default=0.0),
+        "log_statements": log_statements,
+        "block_statements": block_statements,
+    }
+
+
+def compare_with_history(
+    decisions: List[Dict], redemptions: List[SimpleNamespace], window: int
+) -> Dict:
+    """Match each recorded Redeemed log to the latest replay decision for the same subscription
+    no more than `window` blocks before it.
+
+    Redemptions without one were missed by the replay; decisions left over are extra ones,
+    which production didn't redeem (in time).
+    """
+    pending: Dict[Tuple[int, str], List[int]] = {}
+    for decision in decisions:
+        key = (decision["sub_id"], decision["module"].lower())
+        pending.setdefault(key, []).append(decision["block_number"])
+
+    matched, missed, lags = 0, 0, []
+    for log in redemptions:
+        blocks = pending.get((log.subId, str(log.module).lower()), [])
+        candidates = [b for b in blocks if log.block_number - window <= b <= log.block_number]
+        if not candidates:
+            missed += 1
+            continue
+        # Decisions older than the window, and the one matched, are settled
+        decided = max(candidates)
+        blocks[:] = [b for b in blocks if b > decided]
+        matched += 1
+        lags.append(log.block_number - decided)
+
+    return {
+        "matched": matched,
+        "missed": missed,
+        "extra": len(decisions) - matched,
+        "lag_p50_blocks": statistics.median(lags) if lags else 0,
+        "lag_max_blocks": max(lags, default=0),
+    }
+
+
+def print_report(report: Dict) -> None:
+    click.echo(
+        f"\nReplayed {report['blocks']:,} blocks and {report['logs']:,} logs in "
+        f"{report['elapsed_s']:.2f} s: {report['blocks_per_s']:,.0f} blocks/s"
+    )
+    click.echo(
+        f"handler latency per block  p50 {report['handler_p50_ms']:.2f} ms, "
+        f"p95 {report['handler_p95_ms']:.2f} ms, max {report['handler_max_ms']:.2f} ms"
+    )
+    click.echo(
+        f"DB statements              {report['log_statements']:,} in log handlers, "
+        f"{report['block_statements']:,} in block handler"
+    )
+    click.echo(
+        f"redemption decisions       {report['dispatched']:,} dispatched, "
+        f"{report['deferred']:,} deferred, {report['pathfinder_queries']:,} pathfinder queries, "
+        f"{report['transactions']:,} transactions for {report['redemptions_sent']:,} redemptions"
+    )
+    if report["failures"]:
+        failures = ", ".join(f"{reason} {count}" for reason, count in report["failures"].items())
+        click.echo(f"failed attempts            {failures}")
+    click.echo(
+        f"vs recorded Redeemed logs  {report['matched']:,} matched, {report['missed']:,} missed, "
+        f"{report['extra']:,} extra; lag p50 {report['lag_p50_blocks']} blocks, "
+        f"max {report['lag_max_blocks']}"
+    )
+
+
+@click.command()
+@click.argument("capture_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--match-window", default=20, help="Blocks a decision may precede the recorded redemption."
+)
+@click.option("--decisions-output", type=click.Path(dir_okay=False), help="Write decisions here.")
+@click.option("--json-output", type=click.Path(dir_okay=False), help="Also write the report here.")
+@click.option("--verbose", is_flag=True, help="Show the bot's own output.")
+@click.option("--keep-schema", is_flag=True, help=f"Keep the {BENCH_SCHEMA} schema afterwards.")
+def main(capture_path, match_window, decisions_output, json_output, verbose, keep_schema):
+    """Replay a capture of blocks and SubscriptionCreated/Redeemed logs through the bot's handlers.
+
+    CAPTURE_PATH is JSONL (optionally gzipped) or Parquet. The pathfinder and transaction
+    submission are stubbed so every redemption succeeds, and redemptions run inline, so repeated
+    runs make the same decisions. Bot settings come from the usual environment variables. Needs
+    a scratch Postgres at DATABASE_URL; all tables live in a separate schema.
+    """
+    if not os.environ.get("DATABASE_URL"):
+        raise click.UsageError("DATABASE_URL must point at a scratch Postgres database")
+
+    capture = Capture(_read_records(capture_path))
+    click.echo(f"Loaded {len(capture.blocks):,} blocks and {capture.log_count:,} logs")
+
+    execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}", *SCHEMA_STATEMENTS)
+    execute("TRUNCATE subscriptions, subscription_events, sync_status")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import bot
+
+    recorder = Recorder()
+    pathfinder = install_stubs(bot, capture, recorder)
+    try:
+        report = replay(bot, capture, recorder, verbose)
+    finally:
+        bot.db_pool.close()
+        if not keep_schema:
+            execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+
+    report.update(
+        dispatched=len(recorder.decisions),
+        deferred=recorder.deferred,
+        failures=recorder.failures,
+        pathfinder_queries=pathfinder.queries,
+        transactions=recorder.transactions,
+        redemptions_sent=recorder.redemptions_sent,
+        **compare_with_history(recorder.decisions, capture.redemptions(), match_window),
+    )
+    print_report(report)
+
+    if decisions_output:
+        with open(decisions_output, "w") as f:
+            for decision in recorder.decisions:
+                f.write(json.dumps(decision) + "\n")
+    if json_output:
+        with open(json_output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import heapq
+import random
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+SubKey = Tuple[int, str]
+
+
+@dataclass
+class Subscription:
+    """A subscription as tracked by the in-process scheduler."""
+
+    sub_id: int
+    module: str
+    subscriber: str
+    recipient: str
+    amount: int
+    frequency: int
+    redeem_at: int
+
+    @property
+    def key(self) -> SubKey:
+        return (self.sub_id, self.module)
+
+
+@dataclass
+class FailureState:
+    """Consecutive failed redemption attempts for one subscription."""
+
+    count: int = 0
+    transient: int = 0
+    last_error: str = ""
+    next_retry_at: int = 0
+    quarantined: bool = False
+
+
+class RedemptionScheduler:
+    """Min-heap of subscriptions ordered by `redeem_at`.
+
+    Heap entries are never updated in place. Every (re)schedule pushes a new entry tagged with a
+    fresh sequence number, and entries whose sequence number no longer matches the subscription's
+    queued one are discarded lazily when they reach the top of the heap.
+
+    Popped subscriptions stay known to the scheduler but are not queued until they are either
+    rescheduled (a `Redeemed` event arrived) or a failed attempt is recorded. Failed subscriptions
+    are queued at `max(redeem_at, next_retry_at)` with exponential backoff and jitter, and are
+    quarantined (never popped again) after `quarantine_after` consecutive failures, until a
+    `Redeemed` event shows the subscription can be redeemed after all. Transient failures, which
+    say nothing about the subscription itself, back off the same way but are never quarantined.
+    """
+
+    def __init__(
+        self,
+        retry_base_delay: int = 60,
+        retry_max_delay: int = 3600,
+        retry_jitter: float = 0.2,
+        quarantine_after: int = 8,
+    ):
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_jitter = retry_jitter
+        self.quarantine_after = quarantine_after
+
+        self._heap: List[Tuple[int, int, SubKey]] = []
+        self._subscriptions: Dict[SubKey, Subscription] = {}
+        self._queued: Dict[SubKey, Tuple[int, int]] = {}
+        self._failures: Dict[SubKey, FailureState] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of subscriptions currently queued."""
+        return len(self._queued)
+
+    def __contains__(self, key: SubKey) -> bool:
+        return key in self._subscriptions
+
+    def get(self, sub_id: int, module: str) -> Optional[Subscription]:
+        return self._subscriptions.get((sub_id, module))
+
+    def subscriptions(self) -> List[Subscription]:
+        """Every known subscription, queued or not."""
+        with self._lock:
+            return list(self._subscriptions.values())
+
+    def schedule(self, sub: Subscription) -> None:
+        """Add or replace a subscription and queue it at its `redeem_at`."""
+        with self._lock:
+            self._subscriptions[sub.key] = sub
+            self._failures.pop(sub.key, None)
+            self._push(sub.key, sub.redeem_at)
+
+    def reschedule(self, sub_id: int, module: str, redeem_at: int) -> bool:
+        """Move a known subscription to a new `redeem_at`, return False if it is unknown.
+
+        This is the outcome of a successful redemption, so any failure state is cleared.
+        """
+        with self._lock:
+            sub = self._subscriptions.get((sub_id, module))
+            if sub is None:
+                return False
+
+            sub.redeem_at = redeem_at
+            self._failures.pop(sub.key, None)
+            self._push(sub.key, redeem_at)
+            return True
+
+    def record_failure(
+        self, sub_id: int, module: str, error: str, now: int, transient: bool = False
+    ) -> FailureState:
+        """Count a failed attempt and requeue the subscription once its backoff has elapsed.
+
+        Transient failures lengthen the backoff but don't count towards quarantine.
+        """
+        with self._lock:
+            key = (sub_id, module)
+            failure = self._failures.setdefault(key, FailureState())
+            if transient:
+                failure.transient += 1
+            else:
+                failure.count += 1
+            failure.last_error = error
+
+            sub = self._subscriptions.get(key)
+            if sub is None or key in self._queued:
+                return failure
+
+            if not transient and failure.count >= self.quarantine_after:
+                failure.quarantined = True
+                return failure
+
+            attempts = failure.count + failure.transient
+            delay = min(self.retry_base_delay * 2 ** (attempts - 1), self.retry_max_delay)
+            delay *= 1 + random.uniform(-self.retry_jitter, self.retry_jitter)
+            failure.next_retry_at = now + int(delay)
+
+            self._push(key, max(sub.redeem_at, failure.next_retry_at))
+            return failure
+
+    def defer(self, sub_id: int, module: str, due_at: int) -> None:
+        """Queue a popped subscription again at `due_at` without counting it as a failure."""
+        with self._lock:
+            key = (sub_id, module)
+            if key in self._subscriptions and key not in self._queued:
+                self._push(key, due_at)
+
+    def failure(self, sub_id: int, module: str) -> Optional[FailureState]:
+        return self._failures.get((sub_id, module))
+
+    def quarantined(self) -> List[SubKey]:
+        with self._lock:
+            return [key for key, failure in self._failures.items() if failure.quarantined]
+
+    def remove(self, sub_id: int, module: str) -> None:
+        with self._lock:
+            self._subscriptions.pop((sub_id, module), None)
+            self._queued.pop((sub_id, module), None)
+            self._failures.pop((sub_id, module), None)
+
+    def pop_due(self, timestamp: int, limit: Optional[int] = None) -> List[Subscription]:
+        """Pop up to `limit` subscriptions due at `timestamp`, most overdue first."""
+        due = []
+        with self._lock:
+            while self._heap and (limit is None or len(due) < limit):
+                due_at, seq, key = self._heap[0]
+                if not self._is_current(seq, key):
+                    heapq.heappop(self._heap)
+                    continue
+                if due_at > timestamp:
+                    break
+
+                heapq.heappop(self._heap)
+                del self._queued[key]
+                due.append(self._subscriptions[key])
+
+        return due
+
+    def peek_due(
+        self,
+        timestamp: int,
+        limit: Optional[int] = None,
+        where: Optional[Callable[[Subscription], bool]] = None,
+    ) -> List[Subscription]:
+        """Return up to `limit` queued subscriptions due by `timestamp`, soonest first, in place.
+
+        Only subscriptions matching `where` are returned or count towards `limit`.
+        """
+        due = []
+        with self._lock:
+            # Best-first walk over the heap array, so only the entries returned are visited
+            frontier = [(self._heap[0], 0)] if self._heap else []
+            while frontier and (limit is None or len(due) < limit):
+                (due_at, seq, key), i = heapq.heappop(frontier)
+                if due_at > timestamp:
+                    break
+                if self._is_current(seq, key):
+                    sub = self._subscriptions[key]
+                    if where is None or where(sub):
+                        due.append(sub)
+
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(frontier, (self._heap[child], child))
+
+        return due
+
+    def next_due_at(self) -> Optional[int]:
+        """Earliest time a queued subscription becomes due, or None when nothing is queued."""
+        with self._lock:
+            while self._heap and not self._is_current(self._heap[0][1], self._heap[0][2]):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _is_current(self, seq: int, key: SubKey) -> bool:
+        queued = self._queued.get(key)
+        return queued is not None and queued[0] == seq
+
+    def _push(self, key: SubKey, due_at: int) -> None:
+        self._seq += 1
+        self._queued[key] = (self._seq, due_at)
+        heapq.heappush(self._heap, (due_at, self._seq, key))
+
+        # Stale entries only leave the heap when they surface; rebuild once they dominate it.
+        if len(self._heap) > 2 * len(self._queued) + 64:
+            self._heap = [(due_at, seq, key) for key, (seq, due_at) in self._queued.items()]
+            heapq.heapify(self._heap)
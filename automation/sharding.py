@@ -0,0 +1,131 @@
+import math
+import random
+import threading
+import time
+import zlib
+from typing import FrozenSet, Optional, Set
+
+import click
+import psycopg2
+
+from scheduler import SubKey
+
+# Advisory lock keys are (namespace, id) pairs: one exclusive lock per shard, plus one lock that
+# every live instance holds in shared mode so they can count each other.
+SHARD_LOCK_NAMESPACE = 0x53554249  # "SUBI"
+MEMBERSHIP_LOCK_NAMESPACE = SHARD_LOCK_NAMESPACE + 1
+
+
+class ShardLease:
+    """Splits redemptions between bot instances sharing a database.
+
+    Subscriptions hash into `shard_count` shards, and each instance leases a fair share of them
+    (`ceil(shard_count / live instances)`) as Postgres session-level advisory locks held on a
+    dedicated connection. `heartbeat` rebalances at most every `heartbeat_interval` seconds. When
+    an instance dies its session ends, Postgres releases its locks, and the survivors pick up the
+    orphaned shards on their next heartbeat. With `shard_count` 0 sharding is off and every
+    subscription is owned.
+    """
+
+    def __init__(self, dsn: Optional[str], shard_count: int = 0, heartbeat_interval: float = 30.0):
+        self.dsn = dsn
+        self.shard_count = shard_count
+        self.heartbeat_interval = heartbeat_interval
+
+        self._conn = None
+        self._owned: Set[int] = set()
+        self._members = 1
+        self._last_heartbeat: Optional[float] = None
+        # Start probing for free shards at a random offset so instances don't all contend
+        self._offset = random.randrange(shard_count) if shard_count else 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_count > 0
+
+    @property
+    def owned(self) -> FrozenSet[int]:
+        return frozenset(self._owned)
+
+    @property
+    def members(self) -> int:
+        """Number of live instances seen at the last heartbeat, including this one."""
+        return self._members
+
+    def shard_of(self, key: SubKey) -> int:
+        sub_id, module = key
+        return zlib.crc32(f"{sub_id}:{module.lower()}".encode()) % self.shard_count
+
+    def owns(self, key: SubKey) -> bool:
+        return not self.enabled or self.shard_of(key) in self._owned
+
+    def heartbeat(self, force: bool = False) -> None:
+        """Re-count live instances and release or acquire shards to reach a fair share."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._last_heartbeat is not None
+                and now - self._last_heartbeat < self.heartbeat_interval
+            ):
+                return
+            self._last_heartbeat = now
+
+            try:
+                self._rebalance()
+            except psycopg2.Error as e:
+                # The session and every lock on it are gone; own nothing until reconnected
+                click.echo(f"Shard lease heartbeat failed, releasing all shards: {e}")
+                self._drop_connection()
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop_connection()
+
+    def _rebalance(self) -> None:
+        if self._conn is None:
+            self._conn = psycopg2.connect(self.dsn)
+            self._conn.autocommit = True
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_lock_shared(%s, 0)", (MEMBERSHIP_LOCK_NAMESPACE,))
+
+        with self._conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT count(DISTINCT pid) FROM pg_locks
+                WHERE locktype = 'advisory' AND classid = %s AND objid = 0 AND granted
+                """,
+                (MEMBERSHIP_LOCK_NAMESPACE,),
+            )
+            self._members = max(cur.fetchone()[0], 1)
+            target = math.ceil(self.shard_count / self._members)
+
+            # Shed surplus first so newly joined instances find free shards on their next beat
+            while len(self._owned) > target:
+                shard = self._owned.pop()
+                cur.execute("SELECT pg_advisory_unlock(%s, %s)", (SHARD_LOCK_NAMESPACE, shard))
+
+            for i in range(self.shard_count):
+                if len(self._owned) >= target:
+                    break
+
+                shard = (self._offset + i) % self.shard_count
+                if shard in self._owned:
+                    continue
+
+                cur.execute("SELECT pg_try_advisory_lock(%s, %s)", (SHARD_LOCK_NAMESPACE, shard))
+                if cur.fetchone()[0]:
+                    self._owned.add(shard)
+
+    def _drop_connection(self) -> None:
+        self._owned.clear()
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
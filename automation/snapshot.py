@@ -0,0 +1,132 @@
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+import click
+import numpy as np
+
+from scheduler import Subscription
+
+# Fixed header followed by `count` records laid out as SNAPSHOT_DTYPE, little-endian throughout
+SNAPSHOT_MAGIC = b"SUBISNAP"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<8sIQQQ")  # magic, version, chain id, block, record count
+
+SNAPSHOT_DTYPE = np.dtype(
+    [
+        ("sub_id", "<i8"),
+        ("module", "S42"),
+        ("subscriber", "S42"),
+        ("recipient", "S42"),
+        ("amount", "<i8"),
+        ("frequency", "<i8"),
+        ("redeem_at", "<i8"),
+    ]
+)
+
+
+@dataclass
+class Snapshot:
+    block_number: int
+    subscriptions: List[Subscription]
+
+
+class SnapshotFile:
+    """On-disk copy of the scheduler's subscriptions, tagged with the sync cursor it was taken at.
+
+    Writes go to a temporary file that replaces `path` atomically, so a reader sees either the
+    previous snapshot or the new one. Records are fixed-width, so `read` maps the file instead of
+    parsing it. A snapshot from another chain, or one that is truncated or of another version,
+    is ignored. `chain_id` is only called once a snapshot is read or written.
+    """
+
+    def __init__(self, path: str, chain_id: Callable[[], int], interval: float = 300.0):
+        self.path = path
+        self.chain_id = chain_id
+        self.interval = interval
+
+        self._written_at: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def due(self) -> bool:
+        return self._written_at is None or time.monotonic() - self._written_at >= self.interval
+
+    def write(self, block_number: int, subscriptions: Sequence[Subscription]) -> None:
+        records = np.array(
+            [
+                (
+                    sub.sub_id,
+                    sub.module.encode(),
+                    sub.subscriber.encode(),
+                    sub.recipient.encode(),
+                    sub.amount,
+                    sub.frequency,
+                    sub.redeem_at,
+                )
+                for sub in subscriptions
+            ],
+            dtype=SNAPSHOT_DTYPE,
+        )
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(
+                _HEADER.pack(
+                    SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.chain_id(), block_number, len(records)
+                )
+            )
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._written_at = time.monotonic()
+
+    def read(self) -> Optional[Snapshot]:
+        """Load the snapshot at `path`, or None if there is no usable one."""
+        try:
+            size = os.path.getsize(self.path)
+            with open(self.path, "rb") as f:
+                header = f.read(_HEADER.size)
+        except OSError:
+            return None
+
+        if len(header) < _HEADER.size:
+            click.echo(f"[Snapshot] Ignoring {self.path}: truncated header")
+            return None
+
+        magic, version, chain_id, block_number, count = _HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            click.echo(f"[Snapshot] Ignoring {self.path}: unknown format")
+            return None
+        if chain_id != self.chain_id():
+            click.echo(f"[Snapshot] Ignoring {self.path}: taken on chain {chain_id}")
+            return None
+        if size != _HEADER.size + count * SNAPSHOT_DTYPE.itemsize:
+            click.echo(f"[Snapshot] Ignoring {self.path}: expected {count} records")
+            return None
+
+        if count == 0:
+            return Snapshot(block_number, [])
+
+        records = np.memmap(
+            self.path, dtype=SNAPSHOT_DTYPE, mode="r", offset=_HEADER.size, shape=(count,)
+        )
+        columns = [records[name].tolist() for name in SNAPSHOT_DTYPE.names]
+        subscriptions = [
+            Subscription(
+                sub_id=sub_id,
+                module=module.decode(),
+                subscriber=subscriber.decode(),
+                recipient=recipient.decode(),
+                amount=amount,
+                frequency=frequency,
+                redeem_at=redeem_at,
+            )
+            for sub_id, module, subscriber, recipient, amount, frequency, redeem_at in zip(*columns)
+        ]
+        return Snapshot(block_number, subscriptions)
@@ -1,7 +1,11 @@
 import asyncio
 import os
 
-import asyncpg
+# Every committed change to `subscriptions` is published on this channel as compact JSON:
+# {"op": "u", ...every column but created_block} for inserts and edits, {"op": "r", "sub_id",
+# "module", "redeem_at"} when only redeem_at changed, and {"op": "d", "sub_id", "module"} for
+# deletes. "origin" is the application_name of the session that made the change.
+SUBSCRIPTION_CHANGES_CHANNEL = "subscription_changes"
 
 SCHEMA_STATEMENTS = [
     """
@@ -23,8 +27,56 @@ SCHEMA_STATEMENTS = [
         PRIMARY KEY (sub_id, module)
     );
     """,
+    """
+    CREATE TABLE IF NOT EXISTS subscription_events (
+        block_number BIGINT NOT NULL,
+        log_index INTEGER NOT NULL,
+        block_hash TEXT NOT NULL,
+        event_name TEXT NOT NULL,
+        sub_id INTEGER NOT NULL,
+        module TEXT NOT NULL,
+        prev_redeem_at BIGINT,
+        PRIMARY KEY (block_number, log_index)
+    );
+    """,
     "CREATE INDEX IF NOT EXISTS idx_subscriptions_redeem ON subscriptions(redeem_at);",
     "CREATE INDEX IF NOT EXISTS idx_subscriptions_sub_module ON subscriptions(sub_id, module);",
+    f"""
+    CREATE OR REPLACE FUNCTION notify_subscription_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('{SUBSCRIPTION_CHANGES_CHANNEL}', json_build_object(
+                'op', 'd', 'origin', current_setting('application_name'),
+                'sub_id', OLD.sub_id, 'module', OLD.module
+            )::text);
+        ELSIF TG_OP = 'UPDATE' AND OLD IS NOT DISTINCT FROM NEW THEN
+            RETURN NULL;
+        ELSIF TG_OP = 'UPDATE'
+            AND (OLD.subscriber, OLD.recipient, OLD.amount, OLD.frequency)
+                IS NOT DISTINCT FROM (NEW.subscriber, NEW.recipient, NEW.amount, NEW.frequency)
+        THEN
+            PERFORM pg_notify('{SUBSCRIPTION_CHANGES_CHANNEL}', json_build_object(
+                'op', 'r', 'origin', current_setting('application_name'),
+                'sub_id', NEW.sub_id, 'module', NEW.module, 'redeem_at', NEW.redeem_at
+            )::text);
+        ELSE
+            PERFORM pg_notify('{SUBSCRIPTION_CHANGES_CHANNEL}', json_build_object(
+                'op', 'u', 'origin', current_setting('application_name'),
+                'sub_id', NEW.sub_id, 'module', NEW.module,
+                'subscriber', NEW.subscriber, 'recipient', NEW.recipient,
+                'amount', NEW.amount, 'frequency', NEW.frequency, 'redeem_at', NEW.redeem_at
+            )::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS subscriptions_notify ON subscriptions;",
+    """
+    CREATE TRIGGER subscriptions_notify
+    AFTER INSERT OR UPDATE OR DELETE ON subscriptions
+    FOR EACH ROW EXECUTE FUNCTION notify_subscription_change();
+    """,
     """
     INSERT INTO sync_status (name, last_synced_block)
     VALUES ('main', 0)
@@ -34,6 +86,9 @@ SCHEMA_STATEMENTS = [
 
 
 async def create_tables():
+    # Imported here so SCHEMA_STATEMENTS can be reused without asyncpg installed
+    import asyncpg
+
     conn = None
     try:
         database_url = os.getenv("DATABASE_URL")
@@ -0,0 +1,79 @@
+import random
+from typing import List, Optional, Tuple
+
+import pytest
+
+from flowmatrix import TransferStep, create_flow_matrix, encode_flow_matrix
+
+CASES = 500
+
+
+def reference_abi_flow_matrix(
+    from_addr: str, to_addr: str, value: str, transfers: List[TransferStep]
+) -> Optional[Tuple[List[str], List[Tuple], List[Tuple], str]]:
+    """ABI tuple built from the reference FlowMatrix, as the bot originally did."""
+    flow_matrix = create_flow_matrix(from_addr, to_addr, value, transfers)
+    if flow_matrix is None:
+        return None
+
+    return (
+        flow_matrix.flow_vertices,
+        [(edge.stream_sink_id, int(edge.amount)) for edge in flow_matrix.flow_edges],
+        [(s.source_coordinate, s.flow_edge_ids, s.data) for s in flow_matrix.streams],
+        "0x" + flow_matrix.packed_coordinates.hex(),
+    )
+
+
+def random_address(rnd: random.Random) -> str:
+    address = "".join(rnd.choice("0123456789abcdef") for _ in range(40))
+    # Mixed case, like checksummed addresses from the pathfinder
+    return "0x" + "".join(c.upper() if rnd.random() < 0.5 else c for c in address)
+
+
+def random_case(rnd: random.Random) -> Tuple[str, str, str, List[TransferStep]]:
+    """A random payment: transfers over a small address pool, some of them into the receiver."""
+    pool = [random_address(rnd) for _ in range(rnd.randint(2, 12))]
+    sender, receiver = rnd.sample(pool, 2)
+
+    transfers = []
+    for _ in range(rnd.randint(1, 20)):
+        to_address = receiver if rnd.random() < 0.3 else rnd.choice(pool)
+        transfers.append(
+            TransferStep(
+                from_address=rnd.choice(pool),
+                to_address=rnd.choice([to_address, to_address.lower()]),
+                token_owner=rnd.choice(pool),
+                value=str(rnd.randint(1, 10**24)),
+            )
+        )
+
+    terminal = [t for t in transfers if t.to_address.lower() == receiver.lower()] or transfers[-1:]
+    value = sum(int(t.value) for t in terminal)
+    # Now and then ask for an amount the transfers don't deliver
+    if rnd.random() < 0.1:
+        value += rnd.randint(1, 10)
+
+    return sender, receiver, str(value), transfers
+
+
+@pytest.mark.parametrize("seed", range(CASES))
+def test_encoder_matches_reference(seed):
+    rnd = random.Random(seed)
+    sender, receiver, value, transfers = random_case(rnd)
+
+    assert encode_flow_matrix(sender, receiver, value, transfers) == reference_abi_flow_matrix(
+        sender, receiver, value, transfers
+    )
+
+
+def test_encoder_matches_reference_without_terminal_transfer():
+    rnd = random.Random(0)
+    sender, receiver, middle = (random_address(rnd) for _ in range(3))
+    transfers = [
+        TransferStep(sender, middle, sender, "7"),
+        TransferStep(middle, sender, middle, "5"),
+    ]
+
+    expected = reference_abi_flow_matrix(sender, receiver, "5", transfers)
+    assert expected is not None
+    assert encode_flow_matrix(sender, receiver, "5", transfers) == expected
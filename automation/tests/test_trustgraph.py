@@ -0,0 +1,84 @@
+import json
+import os
+from typing import Dict, List, Tuple
+
+import pytest
+
+from flowmatrix import TransferStep, encode_flow_matrix
+from trustgraph import ZERO_ADDRESS, TrustGraph
+
+# Small trust networks with circlesV2_findPath answers for them, derived by hand
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "trustgraph_paths.json")) as f:
+    FIXTURE = json.load(f)
+
+QUERIES = [
+    pytest.param(case, query, id=f"{case['name']}-{i}")
+    for case in FIXTURE["cases"]
+    for i, query in enumerate(case["queries"])
+]
+
+
+def build_graph(case: Dict, max_hops: int) -> TrustGraph:
+    graph = TrustGraph(max_hops=max_hops)
+    for truster, trustee, expiry in case["trust"]:
+        graph.set_trust(truster, trustee, expiry)
+    for account, owner, balance, updated_at in case["balances"]:
+        graph.transfer(ZERO_ADDRESS, account, int(owner, 16), int(balance), updated_at)
+    return graph
+
+
+def check_transfers(graph: TrustGraph, query: Dict, result: Dict, now: float) -> None:
+    """Every transfer is accepted by its receiver and spends only what its sender held, and
+    only the source and sink end up with a net flow, of exactly maxFlow."""
+    net: Dict[str, int] = {}
+    spent: Dict[Tuple[str, str], int] = {}
+    for transfer in result["transfers"]:
+        sender, receiver, owner = transfer["from"], transfer["to"], transfer["tokenOwner"]
+        value = int(transfer["value"])
+        assert value > 0
+        assert graph.accepts(receiver, owner, now)
+        spent[(sender, owner)] = spent.get((sender, owner), 0) + value
+        net[sender] = net.get(sender, 0) - value
+        net[receiver] = net.get(receiver, 0) + value
+
+    for holding, value in spent.items():
+        assert value <= graph._capacity(holding, now)
+
+    max_flow = int(result["maxFlow"])
+    source, sink = query["source"].lower(), query["sink"].lower()
+    assert net.pop(source, 0) == -max_flow
+    assert net.pop(sink, 0) == max_flow
+    assert not any(net.values())
+
+
+@pytest.mark.parametrize("case, query", QUERIES)
+def test_find_path_matches_pathfinder(case, query):
+    now = FIXTURE["now"]
+    graph = build_graph(case, query.get("maxHops", 4))
+
+    result = graph.find_path(query["source"], query["sink"], int(query["targetFlow"]), now)
+
+    expected = int(query["maxFlow"])
+    assert int(result["maxFlow"]) == pytest.approx(expected, rel=query.get("tolerance", 0))
+    check_transfers(graph, query, result, now)
+
+    if expected:
+        transfers: List[TransferStep] = [
+            TransferStep(t["from"], t["to"], t["tokenOwner"], t["value"])
+            for t in result["transfers"]
+        ]
+        encoded = encode_flow_matrix(query["source"], query["sink"], result["maxFlow"], transfers)
+        assert encoded is not None
+
+
+def test_saved_graph_finds_the_same_paths(tmp_path):
+    case = next(case for case in FIXTURE["cases"] if case["name"] == "two_routes")
+    query = case["queries"][0]
+    graph = build_graph(case, max_hops=4)
+    graph.save(str(tmp_path / "graph.json.gz"))
+
+    loaded = TrustGraph(max_hops=4)
+    assert loaded.load(str(tmp_path / "graph.json.gz"))
+
+    args = (query["source"], query["sink"], int(query["targetFlow"]), FIXTURE["now"])
+    assert loaded.find_path(*args)["maxFlow"] == graph.find_path(*args)["maxFlow"]
@@ -0,0 +1,311 @@
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+# Circles demurrage: balances lose 7% a year, applied at each day boundary since day zero
+DEMURRAGE_FACTOR = 0.93 ** (1 / 365.25)
+DEMURRAGE_DAY_ZERO = 1602720000  # 2020-10-15T00:00:00Z
+# Float error allowance so a computed capacity never exceeds the Hub's integer balance
+CAPACITY_MARGIN = 1e-9
+
+ZERO_ADDRESS = "0x" + "00" * 20
+GRAPH_FORMAT_VERSION = 1
+# Residual capacity of a trust edge; the holding feeding it is what bounds the flow
+UNBOUNDED = 1 << 255
+
+Holding = Tuple[str, str]  # (holder, token owner)
+Node = Union[str, Holding]
+
+
+def _day(timestamp: float) -> int:
+    return int((timestamp - DEMURRAGE_DAY_ZERO) // 86400)
+
+
+def token_owner(token_id: int) -> str:
+    """Avatar whose Circles a Hub ERC-1155 id denotes."""
+    return f"0x{token_id:040x}"
+
+
+class TrustGraph:
+    """In-memory Circles trust and balance graph, kept current from Hub events.
+
+    `trust` holds the expiry of every (truster, trustee) pair: a truster accepts the trustee's
+    tokens until then. `balances` holds every account's Hub balance per token owner, with the
+    time it was last updated so daily demurrage can be applied when it is used as a capacity.
+    Balance updates are additive, so transfers may be applied in any order; a trust change only
+    replaces one from an earlier block.
+
+    `find_path` runs Edmonds-Karp over a flow network where an account may spend its balance of
+    a token to any account that accepts that token. Intermediaries only pass on tokens they
+    already held, so the resulting transfers are valid in any execution order. Augmenting paths
+    are limited to `max_hops` transfers. Wrapped ERC-20 Circles aren't modelled.
+    """
+
+    def __init__(self, max_hops: int = 4):
+        self.max_hops = max_hops
+        self.block_number = 0
+
+        self._trust: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._accepters: Dict[str, Set[str]] = {}
+        self._balances: Dict[Holding, Tuple[int, float]] = {}
+        self._holdings: Dict[str, Set[str]] = {}
+        self._saved_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        """Number of non-zero balances."""
+        return len(self._balances)
+
+    # Updates
+    def apply_logs(self, logs: List, block_number: int, timestamp: float) -> None:
+        """Apply every Hub log up to and including `block_number`, in one step.
+
+        `block_number` becomes the last block whose logs are all in the graph, so a saved graph
+        never holds part of a block.
+        """
+        with self._lock:
+            for log in sorted(logs, key=lambda log: (log.block_number, log.log_index)):
+                self.apply_log(log, timestamp)
+            self.block_number = max(self.block_number, block_number)
+
+    def apply_log(self, log, timestamp: Optional[float] = None) -> None:
+        """Apply a Hub Trust, TransferSingle or TransferBatch log."""
+        timestamp = time.time() if timestamp is None else timestamp
+        args = log.event_arguments
+        with self._lock:
+            if log.event_name == "Trust":
+                self.set_trust(
+                    args["truster"], args["trustee"], args["expiryTime"], log.block_number
+                )
+            elif log.event_name == "TransferSingle":
+                self.transfer(args["from"], args["to"], args["id"], args["value"], timestamp)
+            elif log.event_name == "TransferBatch":
+                for token_id, value in zip(args["ids"], args["values"]):
+                    self.transfer(args["from"], args["to"], token_id, value, timestamp)
+
+    def set_trust(self, truster: str, trustee: str, expiry: int, block_number: int = 0) -> None:
+        key = (truster.lower(), trustee.lower())
+        with self._lock:
+            previous = self._trust.get(key)
+            if previous is not None and previous[1] > block_number:
+                return
+
+            self._trust[key] = (int(expiry), block_number)
+            self._accepters.setdefault(key[1], set()).add(key[0])
+
+    def transfer(
+        self, sender: str, receiver: str, token_id: int, value: int, timestamp: float
+    ) -> None:
+        owner = token_owner(int(token_id))
+        with self._lock:
+            if sender.lower() != ZERO_ADDRESS:
+                self._add_balance(sender.lower(), owner, -int(value), timestamp)
+            if receiver.lower() != ZERO_ADDRESS:
+                self._add_balance(receiver.lower(), owner, int(value), timestamp)
+
+    def _add_balance(self, account: str, owner: str, delta: int, timestamp: float) -> None:
+        balance = self._capacity((account, owner), timestamp) + delta
+        if balance > 0:
+            self._balances[(account, owner)] = (balance, timestamp)
+            self._holdings.setdefault(account, set()).add(owner)
+        else:
+            self._balances.pop((account, owner), None)
+            self._holdings.get(account, set()).discard(owner)
+
+    # Queries
+    def accepts(self, account: str, owner: str, now: float) -> bool:
+        trust = self._trust.get((account, owner))
+        return trust is not None and trust[0] > now
+
+    def find_path(
+        self, source: str, sink: str, target_flow: int, now: Optional[float] = None
+    ) -> Dict:
+        """Max flow of up to `target_flow` from `source` to `sink`, in the pathfinder's format.
+
+        Returns {"maxFlow": str, "transfers": [{"from", "to", "tokenOwner", "value"}, ...]}.
+        """
+        now = time.time() if now is None else now
+        source, sink = source.lower(), sink.lower()
+
+        spent: Dict[Holding, int] = {}
+        sent: Dict[Tuple[Holding, str], int] = {}
+        received: Dict[str, Set[Holding]] = {}
+        flow = 0
+
+        with self._lock:
+            while flow < target_flow:
+                path = self._augmenting_path(source, sink, spent, sent, received, now)
+                if path is None:
+                    break
+
+                bottleneck = target_flow - flow
+                for a, b in zip(path, path[1:]):
+                    bottleneck = min(bottleneck, self._residual(a, b, spent, sent, now))
+                if bottleneck <= 0:
+                    break
+
+                for a, b in zip(path, path[1:]):
+                    self._push(a, b, bottleneck, spent, sent, received)
+                flow += bottleneck
+
+        transfers = [
+            {"from": holder, "to": receiver, "tokenOwner": owner, "value": str(value)}
+            for ((holder, owner), receiver), value in sent.items()
+            if value > 0
+        ]
+        return {"maxFlow": str(flow), "transfers": transfers}
+
+    def _capacity(self, holding: Holding, now: float) -> int:
+        entry = self._balances.get(holding)
+        if entry is None:
+            return 0
+
+        balance, updated_at = entry
+        days = max(_day(now) - _day(updated_at), 0)
+        if days == 0:
+            return balance
+        return int(balance * DEMURRAGE_FACTOR**days * (1 - CAPACITY_MARGIN))
+
+    def _augmenting_path(
+        self,
+        source: str,
+        sink: str,
+        spent: Dict[Holding, int],
+        sent: Dict[Tuple[Holding, str], int],
+        received: Dict[str, Set[Holding]],
+        now: float,
+    ) -> Optional[List[Node]]:
+        """Shortest path in the residual network, alternating accounts and holdings."""
+        parents: Dict[Node, Optional[Node]] = {source: None}
+        hops: Dict[Node, int] = {source: 0}
+        queue = deque([source])
+
+        while queue:
+            node = queue.popleft()
+            if isinstance(node, str):
+                if hops[node] >= self.max_hops:
+                    continue
+                # Spend more of a token held, or take back a token sent to this account
+                neighbours = [
+                    (node, owner)
+                    for owner in self._holdings.get(node, ())
+                    if self._capacity((node, owner), now) > spent.get((node, owner), 0)
+                ]
+                neighbours.extend(received.get(node, ()))
+            else:
+                holder, owner = node
+                neighbours = [
+                    account
+                    for account in self._accepters.get(owner, ())
+                    if account != holder and self.accepts(account, owner, now)
+                ]
+                if spent.get(node, 0) > 0:
+                    neighbours.append(holder)
+
+            for neighbour in neighbours:
+                if neighbour in parents:
+                    continue
+                parents[neighbour] = node
+                # Every arrival at an account is one more transfer
+                hops[neighbour] = hops[node] + isinstance(neighbour, str)
+                if neighbour == sink:
+                    path = [neighbour]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                queue.append(neighbour)
+
+        return None
+
+    def _residual(
+        self,
+        a: Node,
+        b: Node,
+        spent: Dict[Holding, int],
+        sent: Dict[Tuple[Holding, str], int],
+        now: float,
+    ) -> int:
+        if isinstance(a, str):
+            if b[0] == a:
+                return self._capacity(b, now) - spent.get(b, 0)
+            return sent.get((b, a), 0)
+        if b == a[0]:
+            return spent.get(a, 0)
+        return UNBOUNDED
+
+    @staticmethod
+    def _push(
+        a: Node,
+        b: Node,
+        amount: int,
+        spent: Dict[Holding, int],
+        sent: Dict[Tuple[Holding, str], int],
+        received: Dict[str, Set[Holding]],
+    ) -> None:
+        if isinstance(a, str):
+            if b[0] == a:
+                spent[b] = spent.get(b, 0) + amount
+            else:
+                sent[(b, a)] -= amount
+                if sent[(b, a)] == 0:
+                    received[a].discard(b)
+        elif b == a[0]:
+            spent[a] -= amount
+        else:
+            sent[(a, b)] = sent.get((a, b), 0) + amount
+            received.setdefault(b, set()).add(a)
+
+    # Persistence
+    def save_due(self, interval: float) -> bool:
+        return self._saved_at is None or time.monotonic() - self._saved_at >= interval
+
+    def save(self, path: str) -> None:
+        """Write the graph to `path` as gzipped JSON, replacing it atomically."""
+        with self._lock:
+            data = {
+                "version": GRAPH_FORMAT_VERSION,
+                "block_number": self.block_number,
+                "trust": [
+                    [truster, trustee, expiry, block_number]
+                    for (truster, trustee), (expiry, block_number) in self._trust.items()
+                ],
+                "balances": [
+                    [account, owner, str(balance), updated_at]
+                    for (account, owner), (balance, updated_at) in self._balances.items()
+                ],
+            }
+
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        self._saved_at = time.monotonic()
+
+    def load(self, path: str) -> bool:
+        """Replace the graph with one written by `save`; False if there is no usable one."""
+        try:
+            with gzip.open(path, "rt") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != GRAPH_FORMAT_VERSION:
+            return False
+
+        with self._lock:
+            self._saved_at = time.monotonic()
+            self._trust.clear()
+            self._accepters.clear()
+            self._balances.clear()
+            self._holdings.clear()
+
+            self.block_number = data["block_number"]
+            for truster, trustee, expiry, block_number in data["trust"]:
+                self.set_trust(truster, trustee, expiry, block_number)
+            for account, owner, balance, updated_at in data["balances"]:
+                self._balances[(account, owner)] = (int(balance), updated_at)
+                self._holdings.setdefault(account, set()).add(owner)
+        return True